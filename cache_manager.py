@@ -0,0 +1,240 @@
+import functools
+import hashlib
+import logging
+import uuid
+from datetime import date
+from urllib.parse import urlencode
+
+import redis
+from flask import request, make_response, current_app
+from flask_caching import Cache
+
+from config_manager import config_manager as appenv
+
+# Configure the logging settings
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+)
+
+
+class CacheManager(Cache):
+
+    default_redis_url = 'redis://localhost:6379/1'
+    default_timeout = 120
+
+    def __init__(self, namespace, app=None):
+        self.namespace = namespace
+        self.endpoints = {}
+        super().__init__(app, config=self.get_config())
+
+    def get_config(self):
+        environ = appenv.environ or {}
+        redis_url = environ.get('CACHE_REDIS_URL') or self.default_redis_url
+        timeout = int(environ.get('CACHE_DEFAULT_TIMEOUT') or self.default_timeout)
+
+        # Every service keeps its entries under its own prefix so clear() only drops its own keys
+        config = {
+            'CACHE_TYPE': 'RedisCache',
+            'CACHE_REDIS_URL': redis_url,
+            'CACHE_KEY_PREFIX': f'codebase:{self.namespace}:',
+            'CACHE_DEFAULT_TIMEOUT': timeout
+        }
+
+        try:
+            redis.from_url(redis_url, socket_connect_timeout=1).ping()
+        except redis.exceptions.RedisError as e:
+            logging.warning(f"Redis is not reachable at {redis_url}, using a per-process cache for "
+                            f"'{self.namespace}': {e}")
+            config = {
+                'CACHE_TYPE': 'SimpleCache',
+                'CACHE_DEFAULT_TIMEOUT': timeout
+            }
+        return config
+
+    def get_timeout(self, name, timeout=None):
+        # TTLs given to cached_endpoint can be overridden per endpoint through CACHE_TIMEOUTS in config.yaml
+        environ = appenv.environ or {}
+        timeouts = environ.get('CACHE_TIMEOUTS') or {}
+        if name in timeouts:
+            return int(timeouts[name])
+        return timeout
+
+    # Tag bumped on re-index, every cached view depends on it
+    data_tag = 'data'
+
+    def get_tag_versions(self, tags):
+        keys = [f"tag:{tag}" for tag in tags]
+        versions = list(self.cache.get_many(*keys))
+        for index, version in enumerate(versions):
+            if version is None:
+                # A tag that was never invalidated (or got evicted) starts from a fresh version, so entries written
+                # under an older version can never be served again
+                version = uuid.uuid4().hex[:12]
+                if not self.cache.add(keys[index], version, timeout=0):
+                    version = self.cache.get(keys[index]) or version
+                versions[index] = version
+        return versions
+
+    def get_data_version(self):
+        return self.get_tag_versions([self.data_tag])[0]
+
+    def invalidate(self, *tags):
+        """
+        Invalidate every cached view that depends on any of the given tags.
+
+        :param tags: Tags such as 'problems', 'sheet:<uid>' or 'playlist:<uid>'
+        """
+        for tag in tags:
+            try:
+                self.cache.set(f"tag:{tag}", uuid.uuid4().hex[:12], timeout=0)
+            except Exception as e:
+                logging.warning(f"Cannot invalidate cache tag {tag}: {e}")
+
+    def invalidate_all(self):
+        self.invalidate(self.data_tag)
+
+    def switch_data_version(self, previous_scope, scope, rebuilt=False):
+        """
+        Keep the data version of the scope being left and bring back the one of the scope being entered, so the views
+        cached for it are served again. A scope seen for the first time, or rebuilt, gets a fresh version.
+
+        :param previous_scope: Scope being left, e.g. the branch switched from
+        :param scope: Scope being entered
+        :param rebuilt: True if the data of the scope changed since it was left
+        """
+        try:
+            self.cache.set(f"tag:{self.data_tag}@{previous_scope}", self.get_data_version(), timeout=0)
+            version = None if rebuilt else self.cache.get(f"tag:{self.data_tag}@{scope}")
+            version = version or uuid.uuid4().hex[:12]
+            self.cache.set(f"tag:{self.data_tag}", version, timeout=0)
+        except Exception as e:
+            logging.warning(f"Cannot switch data version to {scope}: {e}")
+
+    def make_endpoint_key(self, name, tags, daily=False):
+        # The query string is sorted so that ?a=1&b=2 and ?b=2&a=1 share an entry
+        query_string = urlencode(sorted(request.args.items(multi=True)))
+        query_hash = hashlib.md5(query_string.encode('utf-8')).hexdigest()
+        # Bumping a tag changes the key, the entries written under the old version are left to expire
+        versions = '.'.join(self.get_tag_versions([self.data_tag] + tags))
+        key = f"view:{name}:{request.path}:{query_hash}:{versions}"
+        # Views computed relative to today get a new key, and so a new ETag, when the date changes
+        if daily:
+            key = f"{key}:{date.today().isoformat()}"
+        return key
+
+    @staticmethod
+    def make_etag(*parts):
+        return hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def not_modified(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response
+
+    def conditional(self, response, *parts):
+        """
+        Tag a response with a strong ETag derived from the data version and answer If-None-Match with a 304.
+
+        :param response: Response returned by the view
+        :param parts: Values the response depends on besides the data version
+        """
+        try:
+            version = self.get_data_version()
+        except Exception as e:
+            logging.warning(f"Cannot read data version: {e}")
+            return response
+        response = make_response(response)
+        etag = self.make_etag(version, request.path, *parts)
+        if etag in request.if_none_match:
+            return self.not_modified(etag)
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response
+
+    def cached_endpoint(self, name, timeout=None, tags=None, daily=False):
+        """
+        Cache the successful responses of a view, keyed on its path, normalized query string and tag versions.
+        The key also serves as a strong ETag, a matching If-None-Match is answered with a 304 without running the view.
+
+        :param name: Endpoint name used in the cache keys and the metrics
+        :param timeout: TTL of the entries in seconds, defaults to CACHE_DEFAULT_TIMEOUT
+        :param tags: Tags the response depends on, formatted with the view arguments (e.g. 'sheet:{id}')
+        :param daily: True if the response depends on the current date (streaks, today or this month counts)
+        """
+        self.endpoints[name] = timeout
+        tags = tags or []
+
+        def decorator(f):
+            @functools.wraps(f)
+            def decorated_function(*args, **kwargs):
+                try:
+                    key = self.make_endpoint_key(name, [tag.format(**kwargs) for tag in tags], daily)
+                    etag = self.make_etag(key)
+                    if etag in request.if_none_match:
+                        self.record_metric(name, 'not_modified')
+                        return self.not_modified(etag)
+                    cached = self.get(key)
+                except Exception as e:
+                    logging.warning(f"Cannot read cache entry for {name}: {e}")
+                    return f(*args, **kwargs)
+
+                if cached is not None:
+                    self.record_metric(name, 'hits')
+                    data, status, headers = cached
+                    return current_app.response_class(data, status=status, headers=headers)
+
+                self.record_metric(name, 'misses')
+                response = make_response(f(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    response.set_etag(etag)
+                    response.cache_control.no_cache = True
+                    try:
+                        self.set(key, (response.get_data(), response.status_code, list(response.headers.items())),
+                                 timeout=self.get_timeout(name, timeout))
+                    except Exception as e:
+                        logging.warning(f"Cannot write cache entry {key}: {e}")
+                return response
+
+            return decorated_function
+
+        return decorator
+
+    def record_metric(self, name, metric):
+        try:
+            self.cache.inc(f"metrics:{name}:{metric}")
+        except Exception as e:
+            logging.warning(f"Cannot record cache metric {name}:{metric}: {e}")
+
+    def get_metrics(self):
+        names = sorted(self.endpoints.keys())
+        metrics = ('hits', 'misses', 'not_modified')
+        keys = [f"metrics:{name}:{metric}" for name in names for metric in metrics]
+        values = self.cache.get_many(*keys) if keys else []
+        counters = dict(zip(keys, values))
+
+        endpoints = {}
+        totals = dict.fromkeys(metrics, 0)
+        for name in names:
+            endpoint = {metric: int(counters.get(f"metrics:{name}:{metric}") or 0) for metric in metrics}
+            for metric in metrics:
+                totals[metric] += endpoint[metric]
+            endpoint['hit_ratio'] = self.get_hit_ratio(endpoint)
+            endpoint['timeout'] = self.get_timeout(name, self.endpoints[name])
+            endpoints[name] = endpoint
+
+        return {
+            'backend': type(self.cache).__name__,
+            **totals,
+            'hit_ratio': self.get_hit_ratio(totals),
+            'endpoints': endpoints
+        }
+
+    @staticmethod
+    def get_hit_ratio(counters):
+        # A 304 is served without rendering the view, so it counts as a hit
+        served = counters['hits'] + counters['not_modified']
+        total = served + counters['misses']
+        return round(served / total, 4) if total > 0 else 0
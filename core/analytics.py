@@ -1,6 +1,6 @@
 from datetime import timedelta
 
-from sqlalchemy import func
+from sqlalchemy import func, desc
 from models import *
 import database_utility as database
 
@@ -135,6 +135,14 @@ def get_sheet_data(conn):
 def get_trackers_count_query(conn):
     trackers_count = []
     all_trackers = conn.query(Tracker.name, Tracker.level).all()
+
+    # Count problems for every (type, level) pair in a single aggregate
+    type_level_counts = {}
+    type_level_data = conn.query(ProblemType.name, Problem.level, func.count(Problem.id)).join(Problem).filter(
+        Problem.include_count == True).group_by(ProblemType.name, Problem.level).all()
+    for type_name, level, count in type_level_data:
+        type_level_counts[(type_name, level)] = count
+
     for tracker in all_trackers:
         total_count = 0
         level_array = []
@@ -142,8 +150,7 @@ def get_trackers_count_query(conn):
         levels = str(tracker[1]).split(",")
 
         for level in levels:
-            count = (conn.query(func.count(Problem.id)).filter(
-                Problem.include_count == True, Problem.type.has(name=name), Problem.level == level.strip()).all())[0][0]
+            count = type_level_counts.get((name, level.strip()), 0)
             level_array.append({
                 'name': level,
                 'count': count
@@ -197,24 +204,129 @@ def level_count_query(conn):
         Problem.level).all()
 
 
+def month_range(month_date):
+    # Returns the first day of the month and the first day of the next month
+    start_date = month_date.replace(day=1).date() if isinstance(month_date, datetime) else month_date.replace(day=1)
+    end_date = (start_date + timedelta(days=32)).replace(day=1)
+    return start_date, end_date
+
+
 def month_focus_query(conn, prev_month_date):
-    return conn.query(ProblemType.name).join(Problem).filter(
-        Problem.include_count == True,
-        func.strftime('%m', Problem.date_added) == prev_month_date.strftime('%m'),
-        func.strftime('%Y', Problem.date_added) == prev_month_date.strftime('%Y')).group_by(Problem.typeid).order_by(
-        func.count(Problem.id).desc()).limit(1).scalar()
+    start_date, end_date = month_range(prev_month_date)
+    return conn.query(DailyActivity.type).filter(
+        DailyActivity.include_count == True,
+        DailyActivity.date >= start_date,
+        DailyActivity.date < end_date).group_by(DailyActivity.type).order_by(
+        func.sum(DailyActivity.count).desc()).limit(1).scalar()
 
 
 def month_count_query(conn, current_month_date):
-    return conn.query(func.count(Problem.id)).filter(
-        func.strftime('%m', Problem.date_added) == current_month_date.strftime('%m'),
-        func.strftime('%Y', Problem.date_added) == current_month_date.strftime('%Y'),
-        Problem.include_count == True
+    start_date, end_date = month_range(current_month_date)
+    return conn.query(func.coalesce(func.sum(DailyActivity.count), 0)).filter(
+        DailyActivity.date >= start_date,
+        DailyActivity.date < end_date,
+        DailyActivity.include_count == True
     ).scalar()
 
 
 def today_count_query(conn):
-    return conn.query(func.count(Problem.id)).filter(
-        func.date(Problem.date_added) == func.date('now', 'localtime'),
-        Problem.include_count == True
+    return conn.query(func.coalesce(func.sum(DailyActivity.count), 0)).filter(
+        DailyActivity.date == datetime.now().date(),
+        DailyActivity.include_count == True
     ).scalar()
+
+
+def get_timeline():
+    conn = database.create_connection()
+
+    # Read the daily rollup and merge the rows of each date
+    activity_query = conn.query(DailyActivity.date, DailyActivity.problem_ids).order_by(
+        desc(DailyActivity.date)).all()
+    date_map = {}
+    problem_ids = set()
+    for date_value, ids in activity_query:
+        ids = [int(problem_id) for problem_id in str(ids).split(":")] if ids else []
+        date_map.setdefault(date_value, []).extend(ids)
+        problem_ids.update(ids)
+
+    # Fetch the problem names in a single query
+    names_query = conn.query(Problem.id, Problem.name).filter(Problem.id.in_(problem_ids)).all()
+    names = {problem_id: name for problem_id, name in names_query}
+
+    # Initialize timelines
+    full_timeline = {}
+    prev_timeline = {}
+    curr_timeline = {}
+
+    curr_start, curr_end = month_range(datetime.now())
+    prev_start, prev_end = month_range(curr_start - timedelta(days=1))
+
+    for date_value, ids in date_map.items():
+        problems = sorted([
+            {'id': problem_id, 'name': names[problem_id], 'slug': utility.create_slug(names[problem_id])}
+            for problem_id in ids if problem_id in names
+        ], key=lambda x: x['name'])
+        problem_date = date_value.strftime("%Y-%m-%d")
+
+        # Determine current and previous timelines
+        if curr_start <= date_value < curr_end:
+            curr_timeline[problem_date] = problems
+
+        if prev_start <= date_value < prev_end:
+            prev_timeline[problem_date] = problems
+
+        full_timeline[problem_date] = problems
+
+    # Close the database connection
+    database.close_connection(conn)
+
+    return {
+        'full_timeline': full_timeline,
+        'current_timeline': curr_timeline,
+        'previous_timeline': prev_timeline
+    }
+
+
+def get_activity(days=365):
+    conn = database.create_connection()
+    start_date = datetime.now().date() - timedelta(days=days - 1)
+
+    # Problem count per day for the heatmap
+    heatmap_data = conn.query(DailyActivity.date, func.sum(DailyActivity.count)).filter(
+        DailyActivity.include_count == True,
+        DailyActivity.date >= start_date
+    ).group_by(DailyActivity.date).order_by(DailyActivity.date).all()
+
+    # Every active day is needed for the streaks
+    active_dates = [item[0] for item in conn.query(DailyActivity.date).filter(
+        DailyActivity.include_count == True).distinct().order_by(DailyActivity.date).all()]
+
+    database.close_connection(conn)
+
+    return {
+        'heatmap': [{'date': date_value.strftime("%Y-%m-%d"), 'count': count} for date_value, count in heatmap_data],
+        'streak': streak_query(active_dates)
+    }
+
+
+def streak_query(active_dates):
+    longest_streak = 0
+    running_streak = 0
+    previous_date = None
+    for date_value in active_dates:
+        if previous_date is not None and date_value - previous_date == timedelta(days=1):
+            running_streak += 1
+        else:
+            running_streak = 1
+        longest_streak = max(longest_streak, running_streak)
+        previous_date = date_value
+
+    # The current streak is still alive if the last active day was today or yesterday
+    current_streak = 0
+    if previous_date is not None and datetime.now().date() - previous_date <= timedelta(days=1):
+        current_streak = running_streak
+
+    return {
+        'current': current_streak,
+        'longest': longest_streak
+    }
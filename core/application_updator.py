@@ -1,23 +1,27 @@
 import json
 import logging
-import multiprocessing
 import re
 import time
 from datetime import datetime
 import requests
 import shortuuid
-from sqlalchemy import desc, func
+from sqlalchemy import delete, desc, func, insert, select
 
 import application_utility
+import branch_store
 import database_utility
 import os
 
 import email_utility
+import git_refs
 import git_utility
 from config_manager import config_manager as appenv
 import intellisense
+import job_queue
+import recurrence
+import search
 import utility
-from models import Problem, Reminder, Quote
+from models import Problem, Reminder, Quote, ProblemType, DailyActivity, SheetSectionItem, SheetSectionItemResponse
 
 # Configure the logging settings
 logging.basicConfig(
@@ -39,6 +43,16 @@ access_token = None
 if "ACCESS_TOKEN" in appenv.environ:
     access_token = appenv.environ["ACCESS_TOKEN"]
 
+# Seconds changed files wait for further changes before they are committed and pushed, capped at push_max_delay
+push_delay = int(appenv.environ.get("GIT_PUSH_DELAY") or 5)
+push_max_delay = int(appenv.environ.get("GIT_PUSH_MAX_DELAY") or 60)
+
+# 'ff-only' fast-forwards (or rebases) the existing clone on the remote branch, 'reset' hard resets it
+sync_mode = appenv.environ.get("GIT_SYNC_MODE") or 'ff-only'
+
+# First clone: 'full', 'partial' (no history blobs) or 'shallow' (last commit only)
+clone_mode = appenv.environ.get("CLONE_MODE") or 'full'
+
 
 def re_init():
     global dest_path, branch, access_token
@@ -53,31 +67,123 @@ def re_init():
     if "ACCESS_TOKEN" in appenv.environ:
         access_token = appenv.environ["ACCESS_TOKEN"]
 
+    use_branch(branch)
+
+
+def use_branch(name):
+    # Point this process at the working copy and database of a branch
+    global branch
+    branch = name
+    use_paths(*branch_store.get_paths(name))
+
+
+def use_paths(path, database):
+    global dest_path
+    dest_path = path
+    database_utility.database = database
+
+
+def use_active_branch():
+    # Follow a branch switch made by another process, cheap when nothing changed
+    global branch
+    active = branch_store.get_active()
+    if active is not None and (active['dest_path'] != dest_path or active['database'] != database_utility.database):
+        branch = active['branch']
+        use_paths(active['dest_path'], active['database'])
+
+
+def get_active_branch():
+    active = branch_store.get_active()
+    return active['branch'] if active is not None else branch
+
+
+def activate_branch(name):
+    """
+    Make a built branch the one every process serves, keeping the user data of the branch served until now.
+
+    :param name: Name of the branch, its database and working copy must exist
+    """
+    previous = branch_store.get_active()
+    target_path, target_database = branch_store.get_paths(name)
+    if previous is not None and previous['database'] != target_database and os.path.exists(previous['database']):
+        # Quotes, mail logs, playlists and sheets with their progress follow the user to the other branch
+        use_paths(target_path, target_database)
+        connector = database_utility.init_database()
+        database_utility.replace_user_data(connector, previous['database'])
+        link_sheet_items(connector)
+        database_utility.close_connection(connector)
+
+    branch_store.set_active(name, target_path, target_database)
+    use_branch(name)
+    appenv.environ['BRANCH_NAME'] = name
+    utility.write_text_to_file('../config.yaml', appenv.environ)
+
+
+def link_sheet_items(connector):
+    """
+    Link copied sheet items to the problems of this database and index them for search again.
+
+    Responses of items that are no longer stored are dropped, the others are matched again since the problems of
+    another branch may differ.
+
+    :param connector: Database session of the branch whose user tables were replaced
+    """
+    connector.execute(delete(SheetSectionItemResponse).where(
+        SheetSectionItemResponse.sheet_section_item_id.not_in(select(SheetSectionItem.uid))))
+    item_uids = [uid for uid, in connector.query(SheetSectionItem.uid).all()]
+    intellisense.match_sheet_items(connector, item_uids)
+    connector.commit()
+    intellisense.run_sheet_update(connector)
+    search.index_sheet_items(connector)
 
-def reset_progress(connector):
-    intellisense.reset_sheet_progress(connector)
-    intellisense.reset_playlist_progress(connector)
+
+def build_branch(name):
+    """
+    Build the working copy and database of a branch next to the active one, which keeps being served meanwhile.
+
+    :param name: Name of the branch
+    """
+    use_branch(name)
+    try:
+        if not clone_repository():
+            raise RuntimeError(f"Cannot check out the branch {name}")
+        database_utility.remove_database()
+        connector = database_utility.init_database()
+        save_repository_data(connector)
+        database_utility.close_connection(connector)
+    except Exception:
+        # Back to the branch being served
+        re_init()
+        use_active_branch()
+        raise
 
 
 # Get Current Branch
 def get_branch():
-    return git_utility.get_current_branch(dest_path)
+    return git_refs.get_current_branch(dest_path)
 
 
 # Get All Branchs
 def get_branches():
-    return git_utility.get_branches(dest_path)
+    return git_refs.get_branches(dest_path)
 
 
-# Clone the specific Git Repository
+# Clone the specific Git Repository, or fetch the new commits into the existing clone
 def clone_repository():
-    if os.path.exists(dest_path):
-        if git_utility.pull_rebase(dest_path):
-            return git_utility.switch_branch(dest_path, branch)
-        else:
-            return git_utility.clone_repository(repo_url, branch, dest_path, access_token)
-    else:
-        return git_utility.clone_repository(repo_url, branch, dest_path, access_token)
+    # Files waiting for a debounced push are committed first, a sync must never meet a dirty working tree
+    commit_pending_push()
+    primary_path = branch_store.get_base_paths()[0]
+    if dest_path != primary_path:
+        # Branches other than the one of the main clone live in worktrees of it
+        return git_utility.sync_worktree(primary_path, dest_path, branch, sync_mode)
+
+    if os.path.exists(dest_path) and git_utility.sync_repository(dest_path, branch, sync_mode):
+        return True
+    if os.path.exists(os.path.join(dest_path, '.git')) and git_utility.has_unsaved_work(dest_path, branch):
+        # Cloning again would throw away the edits of the user, the working copy is kept as it is
+        logging.warning(f"{dest_path} cannot be synced and has unsaved changes, it is not cloned again")
+        return False
+    return git_utility.clone_repository(repo_url, branch, dest_path, access_token, clone_mode)
 
 
 def switch_branch():
@@ -128,6 +234,8 @@ def save_notes(connector):
                         note_id
                     )
                     database_utility.insert_data(connector, "note_item", values)
+        search.index_notes(connector, dest_path)
+        search.index_sheet_items(connector)
         logging.info(f"Notes Saved to SQlLite DB: {database_utility.database}")
     except Exception as e:
         logging.warning("Exception while retrieving notes... \n", e)
@@ -136,7 +244,8 @@ def save_notes(connector):
 # To save the quotes from api
 def save_quotes(connector):
     try:
-        response = requests.get('https://zenquotes.io/api/quotes')
+        # Bounded, the quotes are loaded inline while the database is rebuilt
+        response = requests.get('https://zenquotes.io/api/quotes', timeout=10)
         for item in response.json():
             author = item['a']
             content = item['q']
@@ -233,15 +342,19 @@ def save_reminders(connector):
         with open(filepath, 'r') as file:
             data = json.load(file)
             logging.info(f"Reminders Retrieved: {data}")
+            now = datetime.now()
             for item in data:
+                start_time = utility.parse_time(item['start_time'])
+                date = utility.parse_date(item['date'])
                 values = (
                     shortuuid.uuid(),
                     item["name"],
                     item["description"],
                     item["recurrence"],
-                    utility.parse_time(item['start_time']),
+                    start_time,
                     utility.parse_time(item['end_time']),
-                    utility.parse_date(item['date']),
+                    date,
+                    recurrence.next_fire_at(item["recurrence"], start_time, date, now)
                 )
                 database_utility.insert_data(connector, "reminders", values)
             logging.info(f"Reminders Saved to SQlLite DB: {database_utility.database}")
@@ -497,9 +610,36 @@ def save_metadata(connector):
                                           companies, remarks
                                           , concepts, date_added, filename, subdirectory,
                                           sheet_item_status, include_count))
+    search.index_problems(connector)
     logging.info(f"Metadata Saved to SQlLite DB: {database_utility.database}")
 
 
+# Rolls up the problems into one row per (date, type, level) for the timeline and analytics
+def save_daily_activity(connector):
+    rows = connector.query(Problem.id, ProblemType.name, Problem.level, Problem.include_count,
+                           Problem.date_added).join(ProblemType, Problem.typeid == ProblemType.id).filter(
+        Problem.date_added.isnot(None)).order_by(Problem.date_added).all()
+
+    activity_map = {}
+    for problem_id, type_name, level, include_count, date_added in rows:
+        key = (date_added.date(), type_name, level, include_count)
+        activity_map.setdefault(key, []).append(str(problem_id))
+
+    # One bulk insert and one commit for the whole rollup
+    values = [{
+        'date': date,
+        'type': type_name,
+        'level': level,
+        'include_count': include_count,
+        'count': len(problem_ids),
+        'problem_ids': ":".join(problem_ids)
+    } for (date, type_name, level, include_count), problem_ids in activity_map.items()]
+    if values:
+        connector.execute(insert(DailyActivity), values)
+    connector.commit()
+    logging.info(f"Daily Activity Saved to SQlLite DB: {database_utility.database}")
+
+
 def get_songs():
     filepath = dest_path + "/songs.json"
     if os.path.exists(filepath):
@@ -510,6 +650,21 @@ def get_songs():
         return None
 
 
+def save_repository_data(connector):
+    save_metadata(connector)
+    save_daily_activity(connector)
+    save_trackers(connector)
+    save_reminders(connector)
+    save_platforms(connector)
+    save_companies(connector)
+    save_remarks(connector)
+    save_settings(connector)
+    save_notes(connector)
+    save_levels(connector)
+    save_statuses(connector)
+    intellisense.run_intellisense(connector)
+
+
 def init_parent_repo():
     create_lock_file("codebase.lock")
     # Init Database
@@ -518,18 +673,9 @@ def init_parent_repo():
     save_quotes(connector)
     is_cloned = clone_repository()
     if is_cloned:
-        save_metadata(connector)
-        save_trackers(connector)
-        save_reminders(connector)
-        save_platforms(connector)
-        save_companies(connector)
-        save_remarks(connector)
-        save_settings(connector)
-        save_notes(connector)
-        save_levels(connector)
-        save_statuses(connector)
-        intellisense.run_intellisense(connector)
+        save_repository_data(connector)
         database_utility.close_connection(connector)
+        branch_store.set_active(branch, dest_path, database_utility.database)
     else:
         logging.error("Cannot Clone the Repository......")
     remove_lock_file("codebase.lock")
@@ -540,30 +686,21 @@ def re_init_parent_repo():
     # Init Database
     database_utility.remove_database()
     connector = database_utility.init_database()
-    save_metadata(connector)
-    save_trackers(connector)
-    save_reminders(connector)
-    save_platforms(connector)
-    save_companies(connector)
-    save_remarks(connector)
-    save_settings(connector)
-    save_notes(connector)
-    save_levels(connector)
-    save_statuses(connector)
-    intellisense.run_intellisense(connector)
-    database_utility.close_connection(connector)
+    save_repository_data(connector)
     save_quotes(connector)
+    database_utility.close_connection(connector)
     remove_lock_file("codebase.lock")
 
 
 def init_system(manual_update=False):
     if manual_update is True:
+        database_utility.snapshot_database("readonly_" + database_utility.database)
         utility.copy_folder(dest_path, "readonly_" + dest_path)
         git_utility.remove_git_folder("readonly_" + dest_path, False)
 
     re_init()
     init_parent_repo()
-    multiprocessing.Process(target=send_mail, args=()).start()
+    job_queue.enqueue('send-mail', group='mail')
 
     if manual_update is True:
         utility.delete_file("readonly_" + database_utility.database)
@@ -635,16 +772,38 @@ def send_inactivity_reminder():
 
 
 def send_reminder_email():
+    advance_reminders(notify=True)
+
+
+def advance_reminders(notify=False):
+    """
+    Move the reminders that fired to their next occurrence, so they leave the next_fire_at <= now range.
+
+    :param notify: Send the event reminder mail of every fired reminder
+    :return: Tuple of the number of fired reminders and the moment the next one fires (None if none will)
+    """
     conn = database_utility.create_connection()
-    reminders = conn.query(Reminder).all()
-    for reminder in reminders:
-        replacements = {
-            "{{EVENTNAME}}": str(reminder["name"]),
-            "{{URL}}": ""
-        }
-        template = email_utility.fetch_template('no-activity', replacements)
-        subject = "You have a Upcoming event"
-        email_utility.send_email(subject, template["plain_content"], template["html_content"])
+    try:
+        now = datetime.now()
+        # Only the reminders due now are loaded, their next occurrence is stored once they are handled
+        heap = recurrence.build_heap(conn, now)
+        due = recurrence.pop_due(heap, now)
+        if notify:
+            emails = []
+            for reminder in due:
+                replacements = {
+                    "{{EVENTNAME}}": str(reminder.name),
+                    "{{URL}}": appenv.environ['EXTERNAL_URL']
+                }
+                template = email_utility.fetch_template('event-reminder', replacements)
+                emails.append(("You have a Upcoming event", template["plain_content"], template["html_content"]))
+            # Sent over one SMTP connection
+            email_utility.send_emails(emails)
+        conn.commit()
+        next_due = conn.query(func.min(Reminder.next_fire_at)).scalar()
+    finally:
+        database_utility.close_connection(conn)
+    return len(due), next_due
 
 
 def upload_conditions(additional_params, uploaded_files=None):
@@ -692,9 +851,7 @@ def save_data(dt_type, uploaded_file_path=None):
         elif dt_type == "note":
             file_paths = save_new_note(file_data)
         if len(file_paths) > 0:
-            for file_path in file_paths:
-                git_utility.commit_file(file_path, access_token)
-            git_utility.push_to_repo(repo_url, branch, dest_path, access_token)
+            schedule_push(file_paths)
             re_init_parent_repo()
 
     except Exception as e:
@@ -702,8 +859,67 @@ def save_data(dt_type, uploaded_file_path=None):
 
 
 def commit_and_push(file_path):
-    git_utility.commit_file(file_path, access_token)
-    git_utility.push_to_repo(repo_url, branch, dest_path, access_token)
+    schedule_push([file_path])
+
+
+def schedule_push(file_paths):
+    # Changes made in a burst are collected in one queued job, committed and pushed by the job worker
+    return job_queue.enqueue_batch('git-push', 'files', file_paths, group='repo', delay=push_delay,
+                                   max_delay=push_max_delay)
+
+
+def commit_changed_files(file_paths):
+    """
+    Commit changed files in the working copies they belong to, one commit per working copy.
+
+    :param file_paths: Paths starting with their working copy, e.g. codebase/notes/a.md
+    :return: Paths of the working copies that exist
+    """
+    # Paths start with the working copy they belong to, a batch may span a branch switch
+    repositories = {}
+    for file_path in file_paths:
+        repo_path, _, file_name = file_path.partition("/")
+        repositories.setdefault(repo_path, []).append(file_name)
+
+    # A worktree removed since the files were changed has nothing left to commit
+    repositories = {repo_path: file_names for repo_path, file_names in repositories.items()
+                    if os.path.exists(repo_path)}
+    for repo_path, file_names in repositories.items():
+        if len(file_names) == 1:
+            commit_message = "Updated " + file_names[0]
+        else:
+            commit_message = f"Updated {len(file_names)} files\n\n" + "\n".join(file_names)
+        if not git_utility.commit_files(repo_path, file_names, commit_message):
+            raise RuntimeError("Cannot commit the changed files")
+    return list(repositories)
+
+
+def commit_pending_push():
+    # The queued push job still pushes these commits when it runs
+    pending = job_queue.get_latest('git-push', ['QUEUED'], include_payload=True)
+    if pending is not None:
+        commit_changed_files(pending['payload'].get('files', []))
+
+
+def commit_and_push_files(file_paths):
+    if not access_token:
+        logging.warning("Access Code is not Present")
+        return
+
+    for repo_path in commit_changed_files(file_paths):
+        # Commits left by a failed push are pushed with the next batch, the job is retried until it goes through
+        repo_branch = git_refs.get_current_branch(repo_path) or branch
+        if not git_utility.push_to_repo(repo_url, repo_branch, repo_path, access_token):
+            raise RuntimeError("Cannot push to the repository")
+
+
+def get_push_status():
+    return {
+        # The payload lists the files of the push
+        'pending': job_queue.get_latest('git-push', ['QUEUED'], include_payload=True),
+        'running': job_queue.get_latest('git-push', ['RUNNING'], include_payload=True),
+        'last': job_queue.get_latest('git-push', ['DONE', 'FAILED'], include_payload=True)
+    }
 
 
 def save_json_file(data, file_path):
@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+import re
+
+import git_refs
+from config_manager import config_manager as appenv
+
+# Configure the logging settings
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+)
+
+# Branch served by every process, with its working copy and database, flipped with an atomic rename
+pointer_file = "active_branch.json"
+
+# Last read pointer with the modification time of the file it was read from
+pointer_cache = {'mtime': None, 'value': None}
+
+
+def get_base_paths():
+    environ = appenv.environ or {}
+    dest_path = environ.get("DEST_PATH") or "codebase"
+    database = (environ.get("DATABASE_NAME") or "codebase") + ".db"
+    return dest_path, database
+
+
+def get_paths(branch):
+    """
+    Return the working copy and database paths of a branch.
+
+    The branch checked out in the main clone uses the configured paths, every other branch gets a git worktree and
+    a database of its own next to them, e.g. codebase-feature_x and codebase-feature_x.db.
+
+    :param branch: Name of the branch
+    """
+    dest_path, database = get_base_paths()
+    primary_branch = git_refs.get_current_branch(dest_path) if os.path.exists(dest_path) else None
+    if primary_branch is None or primary_branch == branch:
+        return dest_path, database
+    suffix = re.sub(r'[^A-Za-z0-9._-]', '_', branch)
+    return f"{dest_path}-{suffix}", f"{database[:-len('.db')]}-{suffix}.db"
+
+
+def is_built(branch):
+    dest_path, database = get_paths(branch)
+    return os.path.exists(database) and os.path.exists(dest_path)
+
+
+def get_active():
+    # Dictionary with branch, dest_path and database, None before the first branch is activated
+    try:
+        mtime = os.stat(pointer_file).st_mtime_ns
+    except OSError:
+        return None
+    if pointer_cache['mtime'] != mtime:
+        try:
+            with open(pointer_file, 'r') as file:
+                pointer_cache['value'] = json.load(file)
+            pointer_cache['mtime'] = mtime
+        except (OSError, ValueError) as e:
+            logging.warning(f"Cannot read {pointer_file}: {e}")
+            return pointer_cache['value']
+    return pointer_cache['value']
+
+
+def set_active(branch, dest_path, database):
+    # Written next to the pointer and renamed over it, readers see the old or the new branch but never a partial file
+    temp_file = f"{pointer_file}.tmp"
+    with open(temp_file, 'w') as file:
+        json.dump({'branch': branch, 'dest_path': dest_path, 'database': database}, file)
+    os.replace(temp_file, pointer_file)
+    logging.info(f"Active branch set to {branch} ({database})")
@@ -1,33 +1,40 @@
 import json
 import os
-import random
 import shutil
 import tempfile
 import time
 from datetime import datetime, timedelta
-import re
 
 import redis
-from flask_caching import Cache
-from sqlalchemy import func, and_, desc
+from sqlalchemy import func, and_
+from sqlalchemy.orm import load_only, contains_eager
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import analytics
+import branch_store
+import importer
+import job_queue
+import recurrence
+import search
+from cache_manager import CacheManager
 from config_manager import config_manager as appenv
-from flask import Flask, jsonify, request, send_from_directory, send_file
+from json_provider import init_json_provider
+from flask import Flask, jsonify, request, send_from_directory, send_file, Response, stream_with_context
 from flask_cors import CORS
 import logging
 import database_utility as database
 import application_updator as updator
 import utility
 from core import intellisense
+from services import code_service, file_service, quote_service
 from core.webhook import performAction
-from models import Quote, Problem, ProblemType, Note, Platform, Tracker, Company, Remark, Setting, Reminder, Playlist, \
-    PlaylistItem, Sheet, SheetSectionItem, Level, Status
+from models import Problem, ProblemType, Note, Platform, Tracker, Company, Remark, Setting, Reminder, Playlist, \
+    PlaylistItem, Sheet, SheetSection, SheetSectionItem, SheetSectionItemResponse, Level, Status
 
 app = Flask(__name__)
 
-cache = Cache(app, config={'CACHE_TYPE': 'simple'})
+cache = CacheManager('core', app)
+init_json_provider(app)
 CORS(app)  # Enable CORS for all routes
 
 # Set up Redis
@@ -44,6 +51,21 @@ limiter = Limiter(
 rate_limit_rule = "10 per second"
 dos_detection_rule = "100 per second"  # Threshold for DoS attack detection
 
+# Seconds note files served by uid may be kept by clients
+file_max_age = 365 * 24 * 3600
+
+# Cache tags invalidated by the uploads (by upload type) and the webhook events (the import jobs use the same)
+upload_tags = {
+    'event': ['reminders'],
+    'tracker': ['trackers', 'analytics'],
+    'link': ['platforms'],
+    'note': ['notes']
+}
+webhook_tags = {
+    'import-playlist': ['playlists', 'playlist:{uid}'],
+    'import-sheet': ['sheets', 'sheet:{uid}']
+}
+
 # Configure the logging settings
 logging.basicConfig(
     level=logging.INFO,
@@ -57,6 +79,12 @@ if "PORT" in appenv.environ:
     port = int(appenv.environ["PORT"]) + 50
 
 
+@app.before_request
+def follow_active_branch():
+    # A branch switch flips the shared pointer, every worker process serves the new branch from its next request
+    updator.use_active_branch()
+
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def home(path):
@@ -76,43 +104,63 @@ def home(path):
 @limiter.limit(rate_limit_rule)
 def serve_file(file_path):
     file_path = file_path.replace("<repo_path>", utility.get_running_repo(updator.dest_path))
-    if os.path.exists(file_path) and os.path.isfile(file_path):
-        return send_file(file_path)
-    else:
+    try:
+        # send_file answers conditional and Range requests itself
+        return send_file(file_path, conditional=True)
+    except (FileNotFoundError, IsADirectoryError):
         return "File not found", 404
 
 
+@app.route('/file/id/<string:uid>')
+@limiter.limit(rate_limit_rule)
+def serve_file_by_id(uid):
+    file_path = file_service.get_path(uid, updator.dest_path, cache.get_data_version)
+    if file_path is None:
+        return "File not found", 404
+    try:
+        # Note item uids are regenerated on every re-index, so the content behind one never changes
+        response = send_file(file_path, conditional=True, max_age=file_max_age)
+    except (FileNotFoundError, IsADirectoryError):
+        return "File not found", 404
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
 @app.route('/code/<path:file_path>')
 @limiter.limit(rate_limit_rule)
 def serve_code(file_path):
     file_path = file_path.replace("<repo_path>", utility.get_running_repo(updator.dest_path))
-    code = ''
-    with open(file_path, 'r', encoding='utf-8') as f:
-        code = f.read()
-        code = re.sub(r'<metadata>.*?</metadata>',
-                      file_path.replace(utility.get_running_repo(updator.dest_path), "File: ").replace('\\', '/'),
-                      code,
-                      flags=re.DOTALL)
-        f.close()
-    return jsonify({'content': code})
-
-
-@cache.cached(timeout=120)
+    label = file_path.replace(utility.get_running_repo(updator.dest_path), "File: ").replace('\\', '/')
+    try:
+        # Rendered files are kept in memory until they change on disk
+        etag, body = code_service.get_rendered(file_path, label,
+                                               lambda code: app.json.response({'content': code}).get_data())
+    except FileNotFoundError:
+        return jsonify({'error': 'File not found'}), 404
+
+    response = app.response_class(body, mimetype=app.json.mimetype)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(body))
+
+
 @app.route('/api/quote', methods=['GET'])
 @limiter.limit(rate_limit_rule)
 def random_quote():
-    conn = database.create_connection()
-    max_id = conn.query(func.max(Quote.id)).scalar()
-    # Generate a random ID within the range of available IDs
-    random_id = random.randint(1, max_id)
-    # Query the quote with the random ID
-    rquote = conn.query(Quote).filter(Quote.id == random_id).first()
-    return jsonify(rquote.__response_json__()), 200
+    # Quotes are kept in memory, mode=day returns the same quote for the whole day
+    if request.args.get('mode') == 'day':
+        quote = quote_service.quote_of_the_day(cache.get_data_version)
+    else:
+        quote = quote_service.random_quote(cache.get_data_version)
+    if quote is None:
+        return jsonify({'error': 'Quote not found'}), 404
+    return jsonify(quote), 200
 
 
-@cache.cached(timeout=120)
 @app.route('/api/songs', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('songs', timeout=3600)
 def get_songs():
     songs = updator.get_songs()
     if songs is not None:
@@ -121,21 +169,16 @@ def get_songs():
         return jsonify({'songs': []})
 
 
-@cache.cached(timeout=120)
-@app.route('/api/problems', methods=['GET'])
-@limiter.limit(rate_limit_rule)
-def get_problems():
-    conn = database.create_connection()
-    problems = []
+# Filter conditions of the problem listings, the query must join ProblemType
+def get_problem_conditions(args):
     conditions = []
 
     # Extract query parameters
-    type_filter = request.args.get('type')
-    status_filter = request.args.get('status')
-    level_filter = request.args.get('level')
-    remark_filter = request.args.get('remark')
-    company_filter = request.args.get('company')
-    res = request.args.get('res')
+    type_filter = args.get('type')
+    status_filter = args.get('status')
+    level_filter = args.get('level')
+    remark_filter = args.get('remark')
+    company_filter = args.get('company')
 
     # Add conditions based on query parameters
     if type_filter:
@@ -148,16 +191,44 @@ def get_problems():
         conditions.append(func.create_slug(Problem.remarks).like(f'%{remark_filter}%'))
     if company_filter:
         conditions.append(func.create_slug(Problem.companies).like(f'%{company_filter}%'))
+    return conditions
+
+
+@app.route('/api/problems', methods=['GET'])
+@limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('problems', timeout=600, tags=['problems'])
+def get_problems():
+    conn = database.create_connection()
+    problems = []
+    conditions = get_problem_conditions(request.args)
 
-    # Apply conditions to the query
+    # Extract query parameters
+    res = request.args.get('res')
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', type=int)
+    try:
+        fields = utility.parse_fields(request.args.get('fields'), Problem.response_columns)
+    except ValueError as e:
+        database.close_connection(conn)
+        return jsonify({'error': str(e)}), 400
 
-    if res is not None and res == 'detail':
+    if (res is not None and res == 'detail') or fields is not None:
         base_query = conn.query(Problem).join(ProblemType, Problem.typeid == ProblemType.id)
+        if fields is not None:
+            base_query = base_query.options(load_only(*Problem.load_columns(fields)))
         if conditions:
             base_query = base_query.filter(and_(*conditions))
         # Execute the query and fetch the results
-        results = [problem.__response_json__() for problem in base_query.all()]
+        try:
+            rows, next_cursor = database.paginate(base_query, [Problem.id], lambda row: [row.id], cursor, limit)
+        except ValueError as e:
+            database.close_connection(conn)
+            return jsonify({'error': str(e)}), 400
+        results = [problem.__response_json__(fields=fields) for problem in rows]
         for item in results:
+            if 'companies' not in item:
+                problems.append(item)
+                continue
             companies = item['companies']
             if companies is not None:
                 companies = str(companies).replace(":", ",")
@@ -177,14 +248,18 @@ def get_problems():
     else:
         base_query = conn.query(Problem.uid, Problem.name, ProblemType.name, Problem.level, Problem.status,
                                 Problem.remarks,
-                                Problem.companies, Problem.subdirectory).join(ProblemType,
-                                                                              Problem.typeid == ProblemType.id)
+                                Problem.companies, Problem.subdirectory, Problem.id).join(ProblemType,
+                                                                                          Problem.typeid == ProblemType.id)
         if conditions:
             base_query = base_query.filter(and_(*conditions))
 
-        results = base_query.all()
+        try:
+            results, next_cursor = database.paginate(base_query, [Problem.id], lambda row: [row[-1]], cursor, limit)
+        except ValueError as e:
+            database.close_connection(conn)
+            return jsonify({'error': str(e)}), 400
         for item in results:
-            uid, name, type, level, status, remarks, companies_str, subdirectory = item
+            uid, name, type, level, status, remarks, companies_str, subdirectory, _ = item
             companies = []
             if companies_str is not None:
                 companies_str = str(companies_str).replace(":", ",")
@@ -213,19 +288,30 @@ def get_problems():
             })
 
     database.close_connection(conn)
-    return jsonify({'problems': problems})
+    return jsonify({'problems': problems, 'next_cursor': next_cursor})
 
 
-@cache.cached(timeout=120)
 @app.route('/api/problems/<string:id>', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('problem', timeout=600, tags=['problems'])
 def get_problem_by_id(id):
     conn = database.create_connection()
-    problem = conn.query(Problem).filter(func.create_slug(Problem.name) == id).first()
+    try:
+        fields = utility.parse_fields(request.args.get('fields'), Problem.response_columns)
+    except ValueError as e:
+        database.close_connection(conn)
+        return jsonify({'error': str(e)}), 400
+    problem_query = conn.query(Problem)
+    if fields is not None:
+        problem_query = problem_query.options(load_only(*Problem.load_columns(fields)))
+    problem = problem_query.filter(func.create_slug(Problem.name) == id).first()
     if problem:
-        problem = problem.__response_json__()
-        companies = problem['companies']
-        if companies is not None:
+        problem = problem.__response_json__(fields=fields)
+        companies = problem.get('companies')
+        if 'companies' not in problem:
+            database.close_connection(conn)
+            return jsonify({'problem': problem})
+        elif companies is not None:
             companies = str(companies).replace(":", ",")
             temp = []
             for company_str in companies.split(","):
@@ -247,26 +333,129 @@ def get_problem_by_id(id):
         return jsonify({'error': 'Problem not found'}), 404
 
 
-@cache.cached(timeout=120)
+# Rows fetched per round trip by the exports
+export_batch_size = 500
+
+
+def expand_companies(item, companies):
+    if 'companies' in item:
+        names = str(item['companies']).replace(":", ",").split(",") if item['companies'] is not None else []
+        item['companies'] = [companies[name] for name in names if name in companies]
+    return item
+
+
+def export_problems(conn, args):
+    fields = utility.parse_fields(args.get('fields'), Problem.response_columns)
+    query = conn.query(Problem).join(ProblemType, Problem.typeid == ProblemType.id).options(
+        contains_eager(Problem.type))
+    if fields is not None:
+        query = query.options(load_only(*Problem.load_columns(fields)))
+    conditions = get_problem_conditions(args)
+    if conditions:
+        query = query.filter(and_(*conditions))
+    query = query.order_by(Problem.id).yield_per(export_batch_size)
+
+    companies = {company.name: company.__response_json__() for company in conn.query(Company)}
+    return (expand_companies(problem.__response_json__(fields=fields), companies) for problem in query)
+
+
+def export_sheets(conn, args):
+    # Sheets are exported without their sections by default, the items have their own export
+    fields = utility.parse_fields(args.get('fields'), Sheet.response_columns)
+    if fields is None:
+        fields = [field for field in Sheet.response_columns if field != 'sections']
+    query = conn.query(Sheet).options(load_only(*Sheet.load_columns(fields)))
+    if 'sections' in fields:
+        query = query.options(*database.sheet_loader_options())
+    query = query.order_by(Sheet.id).yield_per(export_batch_size)
+    return (sheet.__response_json__(fields=fields) for sheet in query)
+
+
+def export_sheet_items(conn, args):
+    query = conn.query(SheetSectionItem, SheetSection.sheet_uid).join(
+        SheetSection, SheetSectionItem.sheet_section_uid == SheetSection.uid)
+    if args.get('sheet'):
+        query = query.filter(SheetSection.sheet_uid == args.get('sheet'))
+    # The problem filters apply to the problem linked to each item
+    conditions = get_problem_conditions(args)
+    if conditions:
+        query = query.join(SheetSectionItemResponse, SheetSectionItemResponse.sheet_section_item_id == SheetSectionItem.uid) \
+            .join(Problem, Problem.uid == SheetSectionItemResponse.problem_id) \
+            .join(ProblemType, Problem.typeid == ProblemType.id) \
+            .filter(and_(*conditions))
+    query = query.options(*database.sheet_item_loader_options()).order_by(SheetSectionItem.id) \
+        .yield_per(export_batch_size)
+    return ({**item.__response_json__(), 'sheet_id': sheet_uid, 'section_id': item.sheet_section_uid}
+            for item, sheet_uid in query)
+
+
+def export_playlists(conn, args):
+    query = conn.query(Playlist).options(*database.playlist_loader_options()).order_by(Playlist.id) \
+        .yield_per(export_batch_size)
+    return (playlist.__response_json__() for playlist in query)
+
+
+export_queries = {
+    'problems': export_problems,
+    'sheets': export_sheets,
+    'sheet-items': export_sheet_items,
+    'playlists': export_playlists
+}
+
+
+@app.route('/api/export/<string:entity>', methods=['GET'])
+@limiter.limit(rate_limit_rule)
+def export_entity(entity):
+    if entity not in export_queries:
+        return jsonify({'error': 'Invalid entity'}), 400
+
+    conn = database.create_connection()
+    try:
+        rows = export_queries[entity](conn, request.args)
+    except ValueError as e:
+        database.close_connection(conn)
+        return jsonify({'error': str(e)}), 400
+
+    # One JSON document per line, the rows are fetched in batches while the response is being sent
+    def generate():
+        try:
+            for row in rows:
+                yield app.json.dumps(row) + "\n"
+        finally:
+            database.close_connection(conn)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @app.route('/api/notes', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('notes', timeout=600, tags=['notes'])
 def get_notes():
     notes = []
     type = request.args.get('type')
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', type=int)
     conn = database.create_connection()
-    if type is not None and type == "detail":
-        notes_query = conn.query(Note).order_by(Note.title).all()
-        notes = [note.__response_json__() for note in notes_query]
-    else:
-        notes_query = conn.query(Note.uid, Note.title).order_by(Note.title).all()
-        notes = [{'id': note[0], 'title': note[1]} for note in notes_query]
-    database.close_connection(conn)
-    return jsonify({'notes': notes})
+    try:
+        if type is not None and type == "detail":
+            notes_query, next_cursor = database.paginate(conn.query(Note), [Note.title, Note.id],
+                                                         lambda row: [row.title, row.id], cursor, limit)
+            notes = [note.__response_json__() for note in notes_query]
+        else:
+            notes_query, next_cursor = database.paginate(conn.query(Note.uid, Note.title, Note.id),
+                                                         [Note.title, Note.id], lambda row: [row[1], row[2]],
+                                                         cursor, limit)
+            notes = [{'id': note[0], 'title': note[1]} for note in notes_query]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        database.close_connection(conn)
+    return jsonify({'notes': notes, 'next_cursor': next_cursor})
 
 
-@cache.cached(timeout=120)
 @app.route('/api/note/<string:id>', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('note', timeout=600, tags=['notes'])
 def get_note_by_id(id):
     conn = database.create_connection()
     note_query = conn.query(Note).filter(Note.uid == id).first()
@@ -291,6 +480,7 @@ def operation_on_note():
             folder_path = f"{updator.dest_path}/notes/{delete_query.title}"
             if delete_query:
                 conn.delete(delete_query)
+                search.remove_note(conn, delete_query.uid)
                 any_operation = True
 
             else:
@@ -302,7 +492,7 @@ def operation_on_note():
             utility.delete_folder(folder_path)
             updator.commit_and_push(folder_path)
             conn.commit()
-            cache.clear()
+            cache.invalidate('notes')
         return jsonify({'message': 'success'})
     except Exception as e:
         conn.rollback()
@@ -311,9 +501,9 @@ def operation_on_note():
         conn.close()
 
 
-@cache.cached(timeout=120)
 @app.route('/api/problem/types', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('problem-types', timeout=3600, tags=['problems'])
 def get_problem_types():
     conn = database.create_connection()
     query_result = conn.query(ProblemType).order_by(ProblemType.name).all()
@@ -322,9 +512,9 @@ def get_problem_types():
     return jsonify({'types': problem_types})
 
 
-@cache.cached(timeout=120)
 @app.route('/api/problem/levels', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('problem-levels', timeout=3600, tags=['problems'])
 def get_problem_levels():
     conn = database.create_connection()
     query_result = conn.query(Level).all()
@@ -333,9 +523,9 @@ def get_problem_levels():
     return jsonify({'levels': problem_levels})
 
 
-@cache.cached(timeout=120)
 @app.route('/api/problem/statuses', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('problem-statuses', timeout=3600, tags=['problems'])
 def get_problem_statuses():
     conn = database.create_connection()
     query_result = conn.query(Status).all()
@@ -345,9 +535,9 @@ def get_problem_statuses():
     return jsonify({'statuses': problem_statuses})
 
 
-@cache.cached(timeout=120)
 @app.route('/api/platforms', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('platforms', timeout=3600, tags=['platforms'])
 def get_platforms():
     conn = database.create_connection()
     platforms_query = conn.query(Platform).all()
@@ -363,6 +553,7 @@ def operation_on_platform():
     type = request.args.get('type')
     platform = json.loads(request.args.get('platform'))
     file_path = f"{updator.dest_path}/platforms.json"
+    updated_tags = ['platforms']
     any_performed = False
     try:
         if 'delete' == type:
@@ -390,7 +581,7 @@ def operation_on_platform():
             updator.commit_and_push(file_path)
 
             conn.commit()
-            cache.clear()
+            cache.invalidate(*updated_tags)
         return jsonify({'message': 'success'})
     except Exception as e:
         conn.rollback()
@@ -399,9 +590,9 @@ def operation_on_platform():
         conn.close()
 
 
-@cache.cached(timeout=120)
 @app.route('/api/trackers', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('trackers', timeout=3600, tags=['trackers'])
 def get_trackers():
     conn = database.create_connection()
     trackers_query = conn.query(Tracker).all()
@@ -417,6 +608,7 @@ def operation_on_tracker():
     type = request.args.get('type')
     tracker = json.loads(request.args.get('tracker'))
     file_path = f"{updator.dest_path}/trackers.json"
+    updated_tags = ['trackers', 'analytics']
     any_performed = False
 
     try:
@@ -445,7 +637,7 @@ def operation_on_tracker():
             updator.commit_and_push(file_path)
 
             conn.commit()
-            cache.clear()
+            cache.invalidate(*updated_tags)
         return jsonify({'message': 'success'})
     except Exception as e:
         conn.rollback()
@@ -454,9 +646,9 @@ def operation_on_tracker():
         conn.close()
 
 
-@cache.cached(timeout=120)
 @app.route('/api/companies', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('companies', timeout=3600, tags=['problems'])
 def get_companies():
     conn = database.create_connection()
     companies_query = conn.query(Company).all()
@@ -465,9 +657,9 @@ def get_companies():
     return jsonify({'companies': companies})
 
 
-@cache.cached(timeout=120)
 @app.route('/api/remarks', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('remarks', timeout=3600, tags=['problems'])
 def get_remarks():
     conn = database.create_connection()
     remarks_query = conn.query(Remark).all()
@@ -476,29 +668,39 @@ def get_remarks():
     return jsonify({'remarks': remarks})
 
 
-@cache.cached(timeout=120)
 @app.route('/api/playlists', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('playlists', timeout=300, tags=['playlists'])
 def get_playlists():
     playlists = []
     res = request.args.get('res')
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', type=int)
     conn = database.create_connection()
-    if res is not None and res == 'detail':
-        playlist_query = conn.query(Playlist).all()
-        playlists = [playlist.__response_json__() for playlist in playlist_query]
-    else:
-        playlist_query = conn.query(Playlist.uid, Playlist.title).all()
-        playlists = [{'id': playlist[0], 'title': playlist[1]} for playlist in playlist_query]
-    database.close_connection(conn)
-    return jsonify({'playlists': playlists})
+    try:
+        if res is not None and res == 'detail':
+            playlist_query, next_cursor = database.paginate(
+                conn.query(Playlist).options(*database.playlist_loader_options()), [Playlist.id],
+                lambda row: [row.id], cursor, limit)
+            playlists = [playlist.__response_json__() for playlist in playlist_query]
+        else:
+            playlist_query, next_cursor = database.paginate(conn.query(Playlist.uid, Playlist.title, Playlist.id),
+                                                            [Playlist.id], lambda row: [row[2]], cursor, limit)
+            playlists = [{'id': playlist[0], 'title': playlist[1]} for playlist in playlist_query]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        database.close_connection(conn)
+    return jsonify({'playlists': playlists, 'next_cursor': next_cursor})
 
 
-@cache.cached(timeout=120)
 @app.route('/api/playlist/<string:id>', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('playlist', timeout=300, tags=['playlist:{id}'])
 def get_playlist_by_id(id):
     conn = database.create_connection()
-    playlist_query = conn.query(Playlist).filter(Playlist.uid == id).first()
+    playlist_query = conn.query(Playlist).options(*database.playlist_loader_options()).filter(
+        Playlist.uid == id).first()
     if playlist_query:
         playlist = playlist_query.__response_json__()
         database.close_connection(conn)
@@ -549,7 +751,7 @@ def operation_on_playlist():
 
         conn.commit()
         intellisense.run_playlist_update(conn)
-        cache.clear()
+        cache.invalidate('playlists', f'playlist:{playlist_uid}')
         return jsonify({'message': 'success'})
 
     except Exception as e:
@@ -568,6 +770,7 @@ def update_playlist_item_status():
     item_status = request.args.get('status', 'INPROGRESS')
     item = conn.query(PlaylistItem).filter_by(uid=item_id).first()
     if item is not None:
+        playlist_uid = item.section.playlist_uid
         item.status = item_status
         # Commit the changes to the database
         conn.commit()
@@ -576,36 +779,60 @@ def update_playlist_item_status():
         conn.close()
         return jsonify({'message': 'not-found'}), 404
     conn.close()
-    cache.clear()
+    cache.invalidate('playlists', f'playlist:{playlist_uid}')
     return jsonify({'message': 'success'})
 
 
-@cache.cached(timeout=120)
 @app.route('/api/sheets', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('sheets', timeout=300, tags=['sheets'])
 def get_sheets():
     sheets = []
     res = request.args.get('res')
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', type=int)
     conn = database.create_connection()
 
-    if res is not None and res == 'detail':
-        sheet_query = conn.query(Sheet).all()
-        sheets = [sheet.__response_json__() for sheet in sheet_query]
-    else:
-        sheet_query = conn.query(Sheet.uid, Sheet.name).all()
-        sheets = [{'id': sheet[0], 'title': sheet[1]} for sheet in sheet_query]
-    database.close_connection(conn)
-    return jsonify({'sheets': sheets})
+    try:
+        fields = utility.parse_fields(request.args.get('fields'), Sheet.response_columns)
+        if (res is not None and res == 'detail') or fields is not None:
+            sheet_query = conn.query(Sheet)
+            if fields is not None:
+                sheet_query = sheet_query.options(load_only(*Sheet.load_columns(fields)))
+            if fields is None or 'sections' in fields:
+                sheet_query = sheet_query.options(*database.sheet_loader_options())
+            sheet_query, next_cursor = database.paginate(sheet_query, [Sheet.id],
+                                                         lambda row: [row.id], cursor, limit)
+            sheets = [sheet.__response_json__(fields=fields) for sheet in sheet_query]
+        else:
+            sheet_query, next_cursor = database.paginate(conn.query(Sheet.uid, Sheet.name, Sheet.id), [Sheet.id],
+                                                         lambda row: [row[2]], cursor, limit)
+            sheets = [{'id': sheet[0], 'title': sheet[1]} for sheet in sheet_query]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        database.close_connection(conn)
+    return jsonify({'sheets': sheets, 'next_cursor': next_cursor})
 
 
-@cache.cached(timeout=120)
 @app.route('/api/sheet/<string:id>', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('sheet', timeout=300, tags=['sheet:{id}'])
 def get_sheet_by_id(id):
     conn = database.create_connection()
-    sheet_query = conn.query(Sheet).filter(Sheet.uid == id).first()
+    try:
+        fields = utility.parse_fields(request.args.get('fields'), Sheet.response_columns)
+    except ValueError as e:
+        database.close_connection(conn)
+        return jsonify({'error': str(e)}), 400
+    sheet_query = conn.query(Sheet)
+    if fields is not None:
+        sheet_query = sheet_query.options(load_only(*Sheet.load_columns(fields)))
+    if fields is None or 'sections' in fields:
+        sheet_query = sheet_query.options(*database.sheet_loader_options())
+    sheet_query = sheet_query.filter(Sheet.uid == id).first()
     if sheet_query:
-        sheet = sheet_query.__response_json__()
+        sheet = sheet_query.__response_json__(fields=fields)
         database.close_connection(conn)
         return jsonify({'sheet': sheet})
     else:
@@ -654,7 +881,8 @@ def operation_on_sheet():
 
         conn.commit()
         intellisense.run_sheet_update(conn)
-        cache.clear()
+        search.index_sheet_items(conn, sheet_uid)
+        cache.invalidate('sheets', f'sheet:{sheet_uid}')
         return jsonify({'message': 'success'})
 
     except Exception as e:
@@ -673,6 +901,7 @@ def update_sheet_item_status():
     item_status = request.args.get('status', 'INPROGRESS')
     item = conn.query(SheetSectionItem).filter_by(uid=item_id).first()
     if item is not None:
+        sheet_uid = item.section.sheet_uid
         item.status = item_status
         # Commit the changes to the database
         conn.commit()
@@ -682,13 +911,13 @@ def update_sheet_item_status():
         conn.close()
         return jsonify({'message': 'not-found'}), 404
     conn.close()
-    cache.clear()
+    cache.invalidate('sheets', f'sheet:{sheet_uid}')
     return jsonify({'message': 'success'})
 
 
-@cache.cached(timeout=120)
 @app.route('/api/settings', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('settings', timeout=3600, tags=['settings'])
 def get_settings():
     conn = database.create_connection()
     settings_query = conn.query(Setting).all()
@@ -697,39 +926,36 @@ def get_settings():
     return jsonify({'settings': settings})
 
 
-@cache.cached(timeout=120)
 @app.route('/api/reminders', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('reminders', timeout=600, tags=['reminders'])
 def get_reminders():
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', type=int)
     conn = database.create_connection()
-    reminders_query = conn.query(Reminder).all()
-    reminders = [reminder.__response_json__() for reminder in reminders_query]
-    database.close_connection(conn)
-    return jsonify({'reminders': reminders})
+    try:
+        reminders_query, next_cursor = database.paginate(conn.query(Reminder), [Reminder.id],
+                                                         lambda row: [row.id], cursor, limit)
+        reminders = [reminder.__response_json__() for reminder in reminders_query]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        database.close_connection(conn)
+    return jsonify({'reminders': reminders, 'next_cursor': next_cursor})
 
 
 @app.route('/api/upcoming/reminders', methods=['GET'])
 @limiter.limit(rate_limit_rule)
 def get_upcoming_reminders():
-    conn = database.create_connection()
-    reminders_query = conn.query(Reminder)
+    # Reminders firing within the next `days` days, or every reminder that will fire again when missing
+    days = request.args.get('days', type=int)
+    now = datetime.now()
+    until = now + timedelta(days=days) if days is not None else None
 
-    once_upcoming_query = reminders_query.filter(Reminder.recurrence == 'ONCE').filter(Reminder.date > datetime.now(),
-                                                                                       Reminder.start_time > datetime.now().time()).all()
-    monthly_upcoming_query = reminders_query.filter(Reminder.recurrence == 'MONTHLY').all()
-
-    everyday_upcoming_query = reminders_query.filter(Reminder.recurrence == 'DAILY').filter(
-        Reminder.start_time > datetime.now().time()).all()
-
-    every_recurrence_query = reminders_query.filter(Reminder.recurrence.like('%EVERY%')).all()
-
-    # Convert query results to dictionaries
+    conn = database.create_connection()
     reminders = []
-
-    reminders.extend([reminder.__response_json__() for reminder in once_upcoming_query])
-    reminders.extend([reminder.__response_json__() for reminder in monthly_upcoming_query])
-    reminders.extend([reminder.__response_json__() for reminder in everyday_upcoming_query])
-    reminders.extend([reminder.__response_json__() for reminder in every_recurrence_query])
+    for fire_at, reminder in recurrence.upcoming_reminders(conn, now, until):
+        reminders.append({**reminder.__response_json__(), 'next_fire_at': fire_at.isoformat()})
     database.close_connection(conn)
     return jsonify({'reminders': reminders})
 
@@ -741,6 +967,7 @@ def operation_on_reminder():
     type = request.args.get('type')
     reminder = json.loads(request.args.get('reminder'))
     file_path = f"{updator.dest_path}/reminders.json"
+    updated_tags = ['reminders']
     any_performed = False
 
     try:
@@ -756,9 +983,11 @@ def operation_on_reminder():
                 update_query.name = reminder['name']
                 update_query.description = reminder['description']
                 update_query.recurrence = reminder['recurrence']
-                update_query.start_time = reminder['start_time']
-                update_query.end_time = reminder['end_time']
-                update_query.date = reminder['date']
+                update_query.start_time = utility.parse_time(reminder['start_time'])
+                update_query.end_time = utility.parse_time(reminder['end_time'])
+                update_query.date = utility.parse_date(reminder['date'])
+                update_query.next_fire_at = recurrence.next_fire_at(update_query.recurrence, update_query.start_time,
+                                                                    update_query.date, datetime.now())
                 any_performed = True
                 # Add any other fields that need to be updated here
             else:
@@ -772,7 +1001,7 @@ def operation_on_reminder():
             updator.commit_and_push(file_path)
 
             conn.commit()
-            cache.clear()
+            cache.invalidate(*updated_tags)
         return jsonify({'message': 'success'})
     except Exception as e:
         conn.rollback()
@@ -781,78 +1010,62 @@ def operation_on_reminder():
         conn.close()
 
 
-@cache.cached(timeout=120)
 @app.route('/api/timeline', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('timeline', timeout=600, tags=['analytics'], daily=True)
 def get_timeline():
-    conn = database.create_connection()
-    # Query distinct problem dates
-    distinct_dates_query = conn.query(
-        func.distinct(func.date(Problem.date_added)).label("problem_date")
-    ).order_by(desc("problem_date")).all()
-
-    # Initialize timelines
-    full_timeline = {}
-    prev_timeline = {}
-    curr_timeline = {}
-
-    # Iterate over distinct dates
-    for item in distinct_dates_query:
-        date_value = datetime.strptime(item.problem_date, "%Y-%m-%d").date()
-
-        # Build base query
-        base_query = conn.query(
-            Problem.id,
-            Problem.name
-        ).filter(func.date(Problem.date_added) == date_value).order_by(Problem.name)
-
-        # Execute query
-        data = base_query.all()
-
-        # Convert query results to dictionaries
-        problems = [
-            {'id': id, 'name': name, 'slug': utility.create_slug(name)}
-            for id, name in data
-        ]
-
-        # Determine current and previous timelines
-        if date_value.month == datetime.now().month:
-            curr_timeline[item.problem_date] = problems
+    # Return JSON response
+    return jsonify({'timeline': analytics.get_timeline()})
 
-        if date_value.month == (datetime.now().replace(day=1) - timedelta(days=1)).replace(day=1).month:
-            prev_timeline[item.problem_date] = problems
 
-        full_timeline[item.problem_date] = problems
+@app.route('/api/activity', methods=['GET'])
+@limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('activity', timeout=600, tags=['analytics'], daily=True)
+def get_activity():
+    days = request.args.get('days', 365, type=int)
+    return jsonify({'activity': analytics.get_activity(days)})
 
-    # Close the database connection
-    database.close_connection(conn)
 
-    timeline = {
-        'full_timeline': full_timeline,
-        'current_timeline': curr_timeline,
-        'previous_timeline': prev_timeline
-    }
+@app.route('/api/search', methods=['GET'])
+@limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('search', timeout=300, tags=['problems', 'notes', 'sheets'])
+def search_all():
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('kind')
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    if not query:
+        return jsonify({'error': 'Missing query'}), 400
+    if kind is not None and kind not in search.kinds:
+        return jsonify({'error': 'Invalid kind'}), 400
 
-    # Return JSON response
-    return jsonify({'timeline': timeline})
+    conn = database.create_connection()
+    try:
+        results = search.search(conn, query, kind, limit)
+    except search.SearchUnavailable as e:
+        logging.warning(f"Search is not available: {e}")
+        return jsonify({'error': 'Search is not available'}), 503
+    finally:
+        database.close_connection(conn)
+    return jsonify({'results': results})
 
 
-@cache.cached(timeout=120)
 @app.route('/api/analytics', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('analytics', timeout=300, tags=['analytics', 'trackers', 'sheets', 'playlists'],
+                       daily=True)
 def get_analytics():
+    # Includes the sheet and playlist completion, hence the sheets and playlists tags
     # Return the analytics dictionary as JSON response
     return jsonify({'analytics': analytics.get_analytics()})
 
 
 @app.route('/api/update', methods=['POST'])
 def update_system():
-    if os.path.exists("codebase.lock"):
+    if is_updating():
         return jsonify({'message': 'sys-update'})
-    else:
-        utility.copy_file("codebase.db", "readonly_codebase.db")
-        updator.init_system(True)
-    return jsonify({'message': 'success'})
+    # The job worker re-indexes and invalidates the caches once done
+    job_id = job_queue.enqueue('reindex', {'manual': True}, group='repo', max_attempts=1)
+    return jsonify({'message': 'success', 'job': job_id})
 
 
 @app.route('/api/upload', methods=['POST'])
@@ -880,7 +1093,10 @@ def upload_file():
     response, code = updator.upload_conditions(additional_params, uploaded_files)
     # Remove temporary directory and its contents
     shutil.rmtree(temp_dir)
-    cache.clear()
+    if additional_params.get('type') in upload_tags:
+        cache.invalidate(*upload_tags[additional_params['type']])
+    else:
+        cache.invalidate_all()
     if code != 200:
         return jsonify(response), 200
 
@@ -891,10 +1107,27 @@ def upload_file():
 @limiter.limit(rate_limit_rule)
 def webhook_api():
     performAction(request.json)
+    event = request.json.get('event')
+    if event in webhook_tags:
+        uid = (request.json.get('payload') or {}).get('id')
+        cache.invalidate(*[tag.format(uid=uid) for tag in webhook_tags[event]])
     response = {'message': 'success'}
     return jsonify(response), 200
 
 
+@app.route('/api/import', methods=['POST'])
+@limiter.limit(rate_limit_rule)
+def import_api():
+    # The import runs on the job worker, the caller polls /api/job/<id> for its progress
+    payload = request.get_json(silent=True)
+    error = importer.validate_payload(payload)
+    if error is not None:
+        return jsonify({'error': error}), 400
+    # A payload that fails once fails every time, it is not retried
+    job_id = job_queue.enqueue('import', payload, max_attempts=1)
+    return jsonify({'message': 'queued', 'job': job_id}), 202
+
+
 @app.route('/api/branch', methods=['GET'])
 @limiter.limit(rate_limit_rule)
 def get_branch():
@@ -914,26 +1147,58 @@ def get_branch():
 @app.route('/api/switch/branch', methods=['POST'])
 def switch_branch():
     branch = request.args.get('branch')
-    if branch is None and branch not in updator.get_branches():
+    if branch is None or branch not in updator.get_branches():
         return jsonify({'message': 'bad request'}), 400
+
+    if branch == updator.get_active_branch():
+        return jsonify({'message': 'success', 'job': None})
+
+    if branch_store.is_built(branch):
+        # Built before, only flipped. The job worker does it once the jobs writing to the served branch are done, so
+        # none of their writes land in the database after its user data was copied
+        job_id = job_queue.enqueue('activate-branch', {'branch': branch}, group='repo', max_attempts=1)
     else:
-        appenv.environ['BRANCH_NAME'] = branch
-        utility.write_text_to_file('../config.yaml', appenv.environ)
-        conn = database.create_connection()
-        updator.reset_progress(conn)
-        conn.close()
-        updator.init_system()
+        # The current branch is served until the new one is built
+        job_id = job_queue.enqueue('build-branch', {'branch': branch}, group='repo', max_attempts=1)
     return jsonify({
-        'message': 'success'
+        'message': 'success',
+        'job': job_id
     })
 
 
+def is_updating():
+    # A re-index is running, or queued and not picked up by the job worker yet
+    return os.path.exists("codebase.lock") or job_queue.is_pending('reindex')
+
+
+@app.route('/api/job/<int:id>', methods=['GET'])
+@limiter.limit(rate_limit_rule)
+def get_job(id):
+    job = job_queue.get_job(id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job})
+
+
+@app.route('/api/git/status', methods=['GET'])
+@limiter.limit(rate_limit_rule)
+def git_status():
+    # Changes waiting to be committed and pushed, the push in progress and the result of the last one
+    return jsonify(updator.get_push_status())
+
+
 @app.route('/api/status', methods=['GET'])
 def system_status():
     status = 'success'
-    if os.path.exists("codebase.lock"):
+    if is_updating():
         status = 'sys-update'
-    return jsonify({'message': status})
+    return cache.conditional(jsonify({'message': status}), status)
+
+
+@app.route('/api/metrics/cache', methods=['GET'])
+@limiter.limit(rate_limit_rule)
+def get_cache_metrics():
+    return jsonify({'message': 'success', 'metrics': cache.get_metrics()})
 
 
 @app.route('/api/clear', methods=['GET'])
@@ -1,7 +1,9 @@
 import logging
+import sqlite3
+import time
 
-from sqlalchemy import create_engine, text, event
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, text, event, tuple_
+from sqlalchemy.orm import sessionmaker, selectinload
 
 from config_manager import config_manager as appenv
 import os
@@ -9,7 +11,7 @@ import os
 import utility
 from models import Base, Quote, Playlist, PlaylistSection, PlaylistItem, MailLog, Reminder, ProblemType, Tracker, Note, \
     Setting, Remark, Company, Platform, Problem, SheetSection, SheetSectionItem, Sheet, NoteItem, Status, Level, \
-    SheetSectionItemResponse
+    SheetSectionItemResponse, DailyActivity
 
 # Configure the logging settings
 logging.basicConfig(
@@ -26,9 +28,19 @@ engine = create_engine(f'sqlite:///{database}')
 Session = sessionmaker(bind=engine)
 metadata = Base.metadata
 
+# User tables, children first so they can be emptied in this order
+user_data_models = [SheetSectionItem, SheetSection, Sheet, PlaylistItem, PlaylistSection, Playlist, MailLog, Quote]
+
+# Stored as PRAGMA user_version, bump it when a column of the user tables is added, renamed or removed
+schema_version = 1
+
+default_page_size = 100
+max_page_size = 500
+
 table_objects = {
     "quotes": Quote,
     "problems": Problem,
+    "daily_activity": DailyActivity,
     "platforms": Platform,
     "companies": Company,
     "remarks": Remark,
@@ -51,6 +63,29 @@ table_objects = {
 }
 
 
+# Loader options that fetch a whole sheet tree (sections, items and matched problems) in a fixed number of queries
+def sheet_loader_options():
+    return [
+        selectinload(Sheet.sections).selectinload(SheetSection.items).selectinload(SheetSectionItem.response)
+        .selectinload(SheetSectionItemResponse.problem).joinedload(Problem.type)
+    ]
+
+
+# Loader options that fetch the linked problem of sheet items
+def sheet_item_loader_options():
+    return [
+        selectinload(SheetSectionItem.response).selectinload(SheetSectionItemResponse.problem)
+        .joinedload(Problem.type)
+    ]
+
+
+# Loader options that fetch a whole playlist tree (sections and items) in a fixed number of queries
+def playlist_loader_options():
+    return [
+        selectinload(Playlist.sections).selectinload(PlaylistSection.items)
+    ]
+
+
 def re_init():
     global database
     appenv.set_environment()
@@ -62,18 +97,20 @@ def re_init():
 # Function to initialize the database and tables
 def init_database():
     global Session, engine, metadata
-    if os.path.exists("codebase.lock"):
-        # Create the SQLAlchemy engine again
-        engine = create_engine(f'sqlite:///{database}')
-        event.listen(engine, 'connect', register_custom_functions)
-        Session = sessionmaker(bind=engine)
-        metadata = Base.metadata
+    # Create the SQLAlchemy engine again, the database name changes with the branch being built
+    engine = create_engine(f'sqlite:///{database}')
+    event.listen(engine, 'connect', register_custom_functions)
+    Session = sessionmaker(bind=engine)
+    metadata = Base.metadata
 
     # Create a session
     session = Session()
 
     # Create tables
     metadata.create_all(engine)
+    with engine.connect() as connection:
+        connection.exec_driver_sql(f"PRAGMA user_version = {schema_version}")
+        connection.commit()
 
     # Retrieve backup data
     retrieve_backup(session)
@@ -82,65 +119,112 @@ def init_database():
     return session
 
 
-def retrieve_backup(session):
-    backup_db = f"backup_{database}"
-    if os.path.exists(backup_db):
-        logging.info("Migration Started....")
+def get_schema_version(connection, schema='main'):
+    return connection.exec_driver_sql(f"PRAGMA {schema}.user_version").scalar()
+
+
+def get_table_columns(connection, table_name, schema='main'):
+    # Rows of PRAGMA table_info are (cid, name, type, notnull, default, pk)
+    return connection.exec_driver_sql(f"PRAGMA {schema}.table_info({table_name})").all()
+
+
+def get_copy_columns(connection, table_name):
+    """
+    Return the columns copied from the backup table, None if the table cannot be copied.
+
+    Columns added since the backup was written take their defaults, columns dropped since then are left behind.
+
+    :param connection: Connection with the backup attached as 'backup'
+    :param table_name: Name of the table
+    """
+    backup_columns = {row[1] for row in get_table_columns(connection, table_name, 'backup')}
+    if not backup_columns:
+        return None
+    columns = []
+    for _, name, _, not_null, default, primary_key in get_table_columns(connection, table_name):
+        if name in backup_columns:
+            columns.append(name)
+        elif not_null and default is None and not primary_key:
+            logging.warning(f"Backup of {table_name} has no {name} column, the table is not migrated")
+            return None
+    return columns
+
+
+def retrieve_backup(session, backup_db=None, replace=False):
+    if backup_db is None:
+        backup_db = f"backup_{database}"
+    if not os.path.exists(backup_db):
+        logging.error("Backup database not found!")
+        return
+
+    logging.info("Migration Started....")
+    start = time.perf_counter()
+    # The tables are copied by SQLite itself, on a connection of its own since ATTACH cannot run in a transaction
+    with session.get_bind().connect() as connection:
+        connection.exec_driver_sql("ATTACH DATABASE ? AS backup", (os.path.abspath(backup_db),))
         try:
-            with session.begin():
-                backup_engine = create_engine(f'sqlite:///{backup_db}')
-                BackupSession = sessionmaker(bind=backup_engine)
-                backup_session = BackupSession()
-
-                # Importing the quotes table entries
-                quotes_backup = backup_session.query(Quote).all()
-                for quote in quotes_backup:
-                    session.merge(quote)
-
-                # Importing the maillogs table entries
-                maillogs_backup = backup_session.query(MailLog).all()
-                for maillog in maillogs_backup:
-                    session.merge(maillog)
-
-                # Importing the playlists table entries
-                playlists_backup = backup_session.query(Playlist).all()
-                for playlist in playlists_backup:
-                    session.merge(playlist)
-
-                # Importing the playlist_sections table entries
-                playlist_sections_backup = backup_session.query(PlaylistSection).all()
-                for section in playlist_sections_backup:
-                    session.merge(section)
-
-                # Importing the playlist_items table entries
-                playlist_items_backup = backup_session.query(PlaylistItem).all()
-                for item in playlist_items_backup:
-                    session.merge(item)
-
-                # Importing the sheet table entries
-                sheets_backup = backup_session.query(Sheet).all()
-                for sheet in sheets_backup:
-                    session.merge(sheet)
-
-                # Importing the sheet_sections table entries
-                sheet_sections_backup = backup_session.query(SheetSection).all()
-                for section in sheet_sections_backup:
-                    session.merge(section)
-
-                # Importing the sheet_section_items table entries
-                sheet_section_items_backup = backup_session.query(SheetSectionItem).all()
-                for item in sheet_section_items_backup:
-                    session.merge(item)
-
-                logging.info("Migration Completed Successfully!")
+            backup_version = get_schema_version(connection, 'backup')
+            if backup_version > schema_version:
+                logging.warning(f"Backup schema version {backup_version} is newer than {schema_version}, "
+                                f"only the known columns are migrated")
+            elif backup_version < schema_version:
+                logging.info(f"Migrating backup schema version {backup_version} to {schema_version}")
+
+            # Emptied in the same transaction, a failed copy leaves the tables as they were
+            if replace:
+                for model in user_data_models:
+                    connection.exec_driver_sql(f"DELETE FROM main.{model.__tablename__}")
+
+            # Parents before children
+            for model in reversed(user_data_models):
+                table_name = model.__tablename__
+                columns = get_copy_columns(connection, table_name)
+                if columns is None:
+                    continue
+                column_list = ", ".join(f'"{column}"' for column in columns)
+                result = connection.exec_driver_sql(f"INSERT OR REPLACE INTO main.{table_name} ({column_list}) "
+                                                    f"SELECT {column_list} FROM backup.{table_name}")
+                logging.info(f"{result.rowcount} {table_name} rows migrated")
+            connection.commit()
+            logging.info(f"Migration Completed Successfully in {time.perf_counter() - start:.3f}s!")
         except Exception as e:
             logging.error(f"Error occurred during migration: {str(e)}")
-            session.rollback()
+            connection.rollback()
         finally:
-            if backup_session:
-                backup_session.close()
-    else:
-        logging.error("Backup database not found!")
+            connection.exec_driver_sql("DETACH DATABASE backup")
+
+
+def snapshot_database(destination):
+    """
+    Copy the database with the SQLite online backup API, a consistent copy even while it is written to.
+
+    Falls back to a file copy when the backup API cannot be used.
+
+    :param destination: Path of the copy
+    """
+    try:
+        source_connection = sqlite3.connect(database)
+        destination_connection = sqlite3.connect(destination)
+        try:
+            with destination_connection:
+                source_connection.backup(destination_connection)
+        finally:
+            destination_connection.close()
+            source_connection.close()
+        logging.info(f"Database snapshot written to {destination}")
+    except sqlite3.Error as e:
+        logging.warning(f"Cannot snapshot the database with the backup API, copying the file: {e}")
+        utility.copy_file(database, destination)
+
+
+def replace_user_data(session, source_db):
+    """
+    Replace the user tables (quotes, mail logs, playlists and sheets) of a database with the ones of another database.
+
+    :param session: Session of the database to update
+    :param source_db: Path of the database to copy the user tables from
+    """
+    retrieve_backup(session, source_db, replace=True)
 
 
 def create_slug(text):
@@ -207,6 +291,35 @@ def insert_data(session, table_name, data, include_primary=False):
     return model_instance.id
 
 
+def paginate(query, order_columns, key, cursor=None, limit=None):
+    """
+    Apply keyset pagination to the query.
+
+    :param query: Query to paginate
+    :param order_columns: Columns giving a stable, unique ordering of the rows
+    :param key: Function returning the values of the order columns for a row
+    :param cursor: Token returned as next_cursor by the previous page
+    :param limit: Maximum number of rows in the page
+    :return: Tuple of the rows and the cursor of the next page (None when there are no more rows)
+    """
+    query = query.order_by(*order_columns)
+    if cursor is None and limit is None:
+        return query.all(), None
+
+    if cursor is not None:
+        values = utility.decode_cursor(cursor)
+        if len(values) != len(order_columns):
+            raise ValueError(f"Invalid cursor '{cursor}'")
+        query = query.filter(tuple_(*order_columns) > tuple_(*values))
+
+    limit = min(max(int(limit or default_page_size), 1), max_page_size)
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, utility.encode_cursor(key(rows[-1]))
+    return rows, None
+
+
 # Function to execute a custom SQL query
 def execute_query(connection, query):
     connection.execute(text(query))
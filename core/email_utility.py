@@ -1,12 +1,16 @@
 import logging
+import re
 import smtplib
 import ssl
+import threading
+import time
 from datetime import datetime
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
 import database_utility
 from config_manager import config_manager as appenv
+from models import MailLog
 import utility
 
 # Configure the logging settings
@@ -15,74 +19,188 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s',
 )
 
+# Placeholders of the templates, e.g. {{HOURS}}
+placeholder_pattern = re.compile(r"(\{\{\w+\}\})")
+
+# Compiled templates by folder name
+templates = {}
+
+# SMTP connection reused between mails, checked with NOOP once it was idle for keepalive_interval seconds
+server = None
+server_lock = threading.Lock()
+last_used = 0
+keepalive_interval = 60
+
 
 def save_email_log(subject, body, recipient, date):
+    save_email_logs([(subject, body, recipient, date)])
+
+
+def save_email_logs(logs):
+    # All the log rows of a batch are written in one transaction
+    if not logs:
+        return
     connector = database_utility.create_connection()
-    database_utility.insert_data(connector, "maillog", (subject, body, recipient, date))
-    connector.close()
+    try:
+        connector.add_all([MailLog(subject=subject, body=body, recipient=recipient, date=date)
+                           for subject, body, recipient, date in logs])
+        connector.commit()
+    finally:
+        database_utility.close_connection(connector)
+
+
+def compile_template(text):
+    # Literal parts at even indexes and placeholders at odd indexes
+    return placeholder_pattern.split(text)
+
+
+def render_template(parts, replace_vars):
+    return "".join(replace_vars.get(part, part) if index % 2 else part for index, part in enumerate(parts))
 
 
 def fetch_template(folder_name, replace_vars=None):
-    email = utility.read_text_from_file('templates' + "/" + folder_name + "/html_content.html")
-    txt = utility.read_text_from_file('templates' + "/" + folder_name + "/plain_content.txt")
-    if replace_vars is not None:
-        for key, value in replace_vars.items():
-            email = email.replace(key, value)
-            txt = txt.replace(key, value)
+    if folder_name not in templates:
+        templates[folder_name] = {
+            'html_content': compile_template(
+                utility.read_text_from_file('templates' + "/" + folder_name + "/html_content.html")),
+            'plain_content': compile_template(
+                utility.read_text_from_file('templates' + "/" + folder_name + "/plain_content.txt"))
+        }
+    template = templates[folder_name]
     return {
-        'html_content': email,
-        'plain_content': txt
+        'html_content': render_template(template['html_content'], replace_vars or {}),
+        'plain_content': render_template(template['plain_content'], replace_vars or {})
     }
 
 
-def send_email(subject, body_text, body_html):
+def get_smtp_settings():
     # Fetch SMTP credentials from environment variables
     smtp_enable = appenv.environ['SMTP_ENABLE']
     smtp_server = appenv.environ['SMTP_ADDRESS']
     smtp_port = appenv.environ['SMTP_PORT']
     smtp_username = appenv.environ['SMTP_USERNAME']
     smtp_password = appenv.environ['SMTP_PASSWORD']
-    recipient_email = appenv.environ['RECIPIENT_EMAIL']
 
     if not (smtp_server and smtp_port and smtp_username and smtp_password and smtp_enable):
         logging.info("SMTP environment variables not set.")
-        return
+        return None
 
     if smtp_enable == 'false':
         logging.info("Skipping Sending Mail......")
-        return
-
-    logging.info("Attempting to send mail......")
-    try:
-        context = ssl.create_default_context()
-        # Create the email message
-        message = MIMEMultipart("alternative")
-        message['From'] = f'Codebase Bot <{smtp_username}>'
-        message["To"] = recipient_email
-        message["Subject"] = subject
+        return None
 
-        # Attach both plain text and HTML versions of the body
-        message.attach(MIMEText(body_text, "plain"))
-        message.attach(MIMEText(body_html, "html"))
-
-        # Connect to the SMTP server
-        server = smtplib.SMTP(smtp_server, port=int(smtp_port))
+    return {
+        'server': smtp_server,
+        'port': int(smtp_port),
+        'username': smtp_username,
+        'password': smtp_password,
+        'recipient': appenv.environ['RECIPIENT_EMAIL'],
+        # Login without TLS, only for relays that cannot do STARTTLS (e.g. a local one) and only when asked for
+        'allow_plaintext': str(appenv.environ.get('SMTP_ALLOW_PLAINTEXT', 'false')).lower() == 'true'
+    }
 
-        server.starttls(context=context)
 
-        # Log in to the SMTP server
-        server.login(smtp_username, smtp_password)
+def connect(settings):
+    connection = smtplib.SMTP(settings['server'], port=settings['port'], timeout=30)
+    connection.ehlo()
+    if connection.has_extn('starttls'):
+        connection.starttls(context=ssl.create_default_context())
+        connection.ehlo()
+    elif not settings.get('allow_plaintext'):
+        # The credentials are never sent in clear text unless SMTP_ALLOW_PLAINTEXT is set
+        connection.close()
+        raise smtplib.SMTPNotSupportedError(f"SMTP server {settings['server']} does not support STARTTLS")
+    connection.login(settings['username'], settings['password'])
+    logging.info(f"Connected to SMTP server {settings['server']}:{settings['port']}")
+    return connection
+
+
+def close_server():
+    global server
+    if server is not None:
+        try:
+            server.quit()
+        except smtplib.SMTPException:
+            server.close()
+        except OSError:
+            pass
+    server = None
+
+
+def get_server(settings):
+    # Must be called with server_lock held
+    global server
+
+    if server is not None and time.monotonic() - last_used > keepalive_interval:
+        try:
+            if server.noop()[0] != 250:
+                close_server()
+        except (smtplib.SMTPException, OSError):
+            # Dead connection, only its socket is left to release
+            server.close()
+            server = None
+
+    if server is None:
+        server = connect(settings)
+    return server
+
+
+def create_message(settings, subject, body_text, body_html):
+    # Create the email message
+    message = MIMEMultipart("alternative")
+    message['From'] = f'Codebase Bot <{settings["username"]}>'
+    message["To"] = settings['recipient']
+    message["Subject"] = subject
+
+    # Attach both plain text and HTML versions of the body
+    message.attach(MIMEText(body_text, "plain"))
+    message.attach(MIMEText(body_html, "html"))
+    return message.as_string()
+
+
+def deliver(settings, message):
+    global server, last_used
 
-        # Send the email
-        server.sendmail(smtp_username, recipient_email, message.as_string())
+    try:
+        get_server(settings).sendmail(settings['username'], settings['recipient'], message)
+    except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException, ConnectionError) as e:
+        # Only a connection closed by the server (421) since the last check is retried, on a new connection
+        if isinstance(e, smtplib.SMTPResponseException) and e.smtp_code != 421:
+            raise
+        close_server()
+        get_server(settings).sendmail(settings['username'], settings['recipient'], message)
+    last_used = time.monotonic()
+
+
+def send_emails(emails):
+    """
+    Send several mails over one SMTP connection and log the delivered ones together, return the number of sent mails.
+
+    :param emails: List of (subject, body_text, body_html) tuples
+    """
+    settings = get_smtp_settings()
+    if settings is None or not emails:
+        return 0
+
+    logging.info(f"Attempting to send {len(emails)} mails......")
+    date = datetime.now().strftime('%Y-%m-%d')
+    logs = []
+    with server_lock:
+        for subject, body_text, body_html in emails:
+            try:
+                deliver(settings, create_message(settings, subject, body_text, body_html))
+                logs.append((subject, body_html, settings['recipient'], date))
+            except Exception as e:
+                logging.warning(f"Exception occured while sending '{subject}': {e}")
+                close_server()
+
+    save_email_logs(logs)
+    logging.info(f"{len(logs)} of {len(emails)} mails have been sent successfully")
+    return len(logs)
 
-        # Quit the SMTP server
-        server.quit()
 
-        save_email_log(subject, body_html, recipient_email, datetime.now().strftime('%Y-%m-%d'))
-        logging.info("Email has been sent successfully")
-    except Exception as e:
-        logging.info("Exception occured... \n", e)
+def send_email(subject, body_text, body_html):
+    send_emails([(subject, body_text, body_html)])
 
 
 def check_if_email_send(subject, date):
@@ -0,0 +1,197 @@
+import logging
+import os
+import subprocess
+
+try:
+    from dulwich.repo import Repo
+    from dulwich.diff_tree import tree_changes
+except ImportError:
+    Repo = None
+
+# Configure the logging settings
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+)
+
+# Branch lists by repository path, with the signature of the ref files they were read from
+branch_cache = {}
+
+
+def git_dir(repo_path):
+    path = os.path.join(repo_path, '.git')
+    # In a worktree .git is a file pointing to its folder inside the main repository
+    if os.path.isfile(path):
+        with open(path, 'r') as file:
+            content = file.read().strip()
+        if content.startswith('gitdir: '):
+            path = os.path.join(repo_path, content[len('gitdir: '):])
+    return path
+
+
+def common_dir(repo_path):
+    # Folder holding the refs shared by the main repository and its worktrees
+    path = git_dir(repo_path)
+    commondir_file = os.path.join(path, 'commondir')
+    if os.path.isfile(commondir_file):
+        with open(commondir_file, 'r') as file:
+            path = os.path.join(path, file.read().strip())
+    return path
+
+
+def read_head(repo_path):
+    # "ref: refs/heads/<branch>" on a branch, a commit id when detached
+    with open(os.path.join(git_dir(repo_path), 'HEAD'), 'r') as file:
+        return file.read().strip()
+
+
+def read_refs(repo_path, prefix):
+    """
+    Read the refs under a prefix from the loose ref files and packed-refs, loose refs win like in git.
+
+    :param repo_path: Path to the Git repository
+    :param prefix: Ref prefix, e.g. refs/heads/
+    :return: Dictionary of ref name to commit id
+    """
+    refs = {}
+    packed_refs = os.path.join(common_dir(repo_path), 'packed-refs')
+    if os.path.exists(packed_refs):
+        with open(packed_refs, 'r') as file:
+            for line in file:
+                # Comments and peeled tag lines (^<id>) carry no ref name
+                if line.startswith(('#', '^')):
+                    continue
+                parts = line.strip().split(' ', 1)
+                if len(parts) == 2 and parts[1].startswith(prefix):
+                    refs[parts[1]] = parts[0]
+
+    root = os.path.join(common_dir(repo_path), prefix)
+    for folder, _, files in os.walk(root):
+        for file_name in files:
+            path = os.path.join(folder, file_name)
+            with open(path, 'r') as file:
+                value = file.read().strip()
+            refs[prefix + os.path.relpath(path, root).replace(os.sep, '/')] = value
+    return refs
+
+
+def get_refs_signature(repo_path):
+    # Modification times of the files a fetch, checkout or branch creation touches
+    signature = []
+    paths = [os.path.join(git_dir(repo_path), 'HEAD')] + [os.path.join(common_dir(repo_path), name) for name in
+                                                          ('FETCH_HEAD', 'packed-refs')]
+    # A branch like feature/y only touches its own folder, every folder of the ref tree is part of the signature
+    for name in ('refs/heads', 'refs/remotes/origin'):
+        root = os.path.join(common_dir(repo_path), name)
+        paths.append(root)
+        for folder, folders, _ in os.walk(root):
+            folders.sort()
+            paths.extend(os.path.join(folder, child) for child in folders)
+    for path in paths:
+        try:
+            signature.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def get_current_branch(repo_path):
+    """
+    Get the current branch of the given Git repository without running git.
+
+    :param repo_path: Path to the Git repository
+    :return: Current branch name, empty when detached, None when the repository cannot be read
+    """
+    try:
+        head = read_head(repo_path)
+    except OSError as e:
+        logging.warning(f"Cannot read HEAD of {repo_path}: {e}")
+        return None
+    if head.startswith('ref: refs/heads/'):
+        return head[len('ref: refs/heads/'):]
+    return ''
+
+
+def get_head_commit(repo_path):
+    # Commit id HEAD points to, None when it cannot be resolved
+    try:
+        head = read_head(repo_path)
+        if not head.startswith('ref: '):
+            return head
+        ref = head[len('ref: '):]
+        loose_ref = os.path.join(common_dir(repo_path), ref)
+        if os.path.isfile(loose_ref):
+            with open(loose_ref, 'r') as file:
+                return file.read().strip()
+        return read_refs(repo_path, ref).get(ref)
+    except OSError:
+        return None
+
+
+def get_branches(repo_path):
+    """
+    Get the local and remote branch names of the given Git repository, cached until its refs change.
+
+    :param repo_path: Path to the Git repository
+    :return: List of unique branch names
+    """
+    signature = get_refs_signature(repo_path)
+    cached = branch_cache.get(repo_path)
+    if cached is not None and cached[0] == signature:
+        return list(cached[1])
+
+    try:
+        refs = list(read_refs(repo_path, 'refs/heads/')) + list(read_refs(repo_path, 'refs/remotes/'))
+    except OSError as e:
+        logging.warning(f"Cannot read refs of {repo_path}: {e}")
+        return []
+
+    # Same names as `git branch -a`: the last part of the ref, without HEAD
+    branches = sorted({ref.split('/')[-1] for ref in refs if ref.split('/')[-1] != 'HEAD'})
+    branch_cache[repo_path] = (signature, branches)
+    return list(branches)
+
+
+def iter_changes(repo_path, old_commit, new_commit):
+    """
+    Iterate over the files changed between two commits, as (status, path) pairs with status A, M or D.
+
+    Uses dulwich when it is installed, otherwise streams the output of `git diff-tree`.
+
+    :param repo_path: Path to the Git repository
+    :param old_commit: Commit id or ref to diff from
+    :param new_commit: Commit id or ref to diff to
+    """
+    if Repo is not None:
+        yield from iter_dulwich_changes(repo_path, old_commit, new_commit)
+        return
+
+    process = subprocess.Popen(['git', 'diff-tree', '-r', '--no-renames', '--name-status', '-z', old_commit,
+                                new_commit], cwd=repo_path, stdout=subprocess.PIPE)
+    try:
+        # -z output is status NUL path NUL, read in chunks so large diffs are not held in memory
+        fields = []
+        remainder = b''
+        for chunk in iter(lambda: process.stdout.read(65536), b''):
+            parts = (remainder + chunk).split(b'\0')
+            remainder = parts.pop()
+            fields.extend(parts)
+            while len(fields) >= 2:
+                status, path = fields.pop(0), fields.pop(0)
+                yield status.decode()[0], path.decode('utf-8', errors='surrogateescape')
+    finally:
+        process.stdout.close()
+        process.wait()
+
+
+def iter_dulwich_changes(repo_path, old_commit, new_commit):
+    statuses = {'add': 'A', 'modify': 'M', 'delete': 'D'}
+    with Repo(repo_path) as repo:
+        old_tree = repo[old_commit.encode()].tree
+        new_tree = repo[new_commit.encode()].tree
+        for change in tree_changes(repo.object_store, old_tree, new_tree):
+            status = statuses.get(change.type)
+            if status == 'D':
+                yield status, change.old.path.decode('utf-8', errors='surrogateescape')
+            elif status is not None:
+                yield status, change.new.path.decode('utf-8', errors='surrogateescape')
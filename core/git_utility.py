@@ -3,6 +3,7 @@ import os
 import platform
 import subprocess
 
+import git_refs
 import utility
 
 # Configure the logging settings
@@ -54,32 +55,126 @@ def remove_git_folder(path, delete_repo=True):
         logging.info(f"Error occurred: {str(e)}")
 
 
-def clone_repository(repo_url, branch, dest_path, access_token):
+# Extra arguments of the first clone, a partial clone downloads the files of the checked out commit only
+clone_mode_args = {
+    'full': [],
+    'partial': ['--filter=blob:none'],
+    'shallow': ['--depth', '1']
+}
+
+
+def clone_repository(repo_url, branch, dest_path, access_token, clone_mode='full'):
     add_folder_to_gitignore(dest_path)
     if os.path.exists(dest_path):
         remove_git_folder(dest_path)
-    else:
-        try:
-            command = ['git', 'clone', '--branch', branch]
-            if access_token:
-                # Include the access token in the clone URL for authentication
-                protocol = repo_url.split("://")[0]
-                url = repo_url.split("://")[1]
-                repository_url_with_token = f'{protocol}://{access_token}@{url}'
-                command.append(repository_url_with_token)
-            else:
-                command.append(repo_url)
-
-            command.append(dest_path)
-
-            subprocess.check_output(command)
-            logging.info(f"Repository cloned successfully: {dest_path}")
-        except subprocess.CalledProcessError as e:
-            logging.warning(f"Error while cloning repository: {e}")
-            return False
+    try:
+        command = ['git', 'clone', '--branch', branch] + clone_mode_args.get(clone_mode, [])
+        if access_token:
+            # Include the access token in the clone URL for authentication
+            protocol = repo_url.split("://")[0]
+            url = repo_url.split("://")[1]
+            repository_url_with_token = f'{protocol}://{access_token}@{url}'
+            command.append(repository_url_with_token)
+        else:
+            command.append(repo_url)
+
+        command.append(dest_path)
+
+        subprocess.run(command, text=True, capture_output=True, check=True)
+        logging.info(f"Repository cloned successfully: {dest_path}")
+    except subprocess.CalledProcessError as e:
+        logging.warning(f"Error while cloning repository: {e.stderr}")
+        return False
     return True
 
 
+def run_git(repo_path, *args):
+    # True if the git command succeeded, its error output is logged otherwise
+    try:
+        subprocess.run(['git'] + list(args), cwd=repo_path, text=True, capture_output=True, check=True)
+        return True
+    except subprocess.CalledProcessError as e:
+        logging.info(f"git {args[0]} failed: {e.stderr.strip()}")
+        return False
+
+
+def fetch_repository(repo_path):
+    # Explicit refspec so single branch (shallow) clones see every branch too, shallow ones stay shallow
+    command = ['fetch', '--prune', 'origin', '+refs/heads/*:refs/remotes/origin/*']
+    if os.path.exists(os.path.join(git_refs.common_dir(repo_path), 'shallow')):
+        command[1:1] = ['--depth', '1']
+    return run_git(repo_path, *command)
+
+
+def sync_worktree(repo_path, worktree_path, branch, sync_mode='ff-only'):
+    """
+    Check out a branch in its own worktree of the repository and bring it up to date with the remote branch.
+
+    :param repo_path: Path to the main Git repository
+    :param worktree_path: Path of the worktree, created when missing
+    :param branch: Branch to check out
+    :param sync_mode: 'ff-only' or 'reset', see sync_repository
+    :return: True if the worktree is checked out at the remote commit (plus local commits), False otherwise
+    """
+    if os.path.exists(os.path.join(worktree_path, '.git')):
+        return sync_repository(worktree_path, branch, sync_mode)
+
+    if not fetch_repository(repo_path):
+        return False
+
+    # A folder left by a removed worktree is replaced
+    utility.remove_directory(worktree_path)
+    run_git(repo_path, 'worktree', 'prune')
+    absolute_path = os.path.abspath(worktree_path)
+    if not run_git(repo_path, 'worktree', 'add', absolute_path, branch):
+        if not run_git(repo_path, 'worktree', 'add', '--track', '-b', branch, absolute_path, f"origin/{branch}"):
+            return False
+    logging.info(f"Worktree for {branch} created at {worktree_path}")
+    return sync_repository(worktree_path, branch, sync_mode)
+
+
+def sync_repository(repo_path, branch, sync_mode='ff-only'):
+    """
+    Bring the working copy up to date with the remote branch without cloning it again.
+
+    Only the commits missing locally are fetched. With 'ff-only' the branch is fast-forwarded, or its local commits
+    are rebased on the remote ones when it diverged; with 'reset' it is hard reset to the remote branch, unless it
+    holds uncommitted files or unpushed commits, which are then rebased like with 'ff-only'.
+
+    :param repo_path: Path to the Git repository
+    :param branch: Branch to check out
+    :param sync_mode: 'ff-only' or 'reset'
+    :return: True if the branch is checked out at the remote commit (plus local commits), False otherwise
+    """
+    if not os.path.exists(os.path.join(repo_path, '.git')):
+        return False
+
+    if not fetch_repository(repo_path):
+        return False
+
+    if not run_git(repo_path, 'switch', branch):
+        if not run_git(repo_path, 'switch', '-c', branch, '--track', f"origin/{branch}"):
+            return False
+
+    # A reset would throw away local commits, e.g. debounced edits whose push is still queued
+    if sync_mode == 'reset' and has_unsaved_work(repo_path, branch):
+        logging.info(f"{repo_path} has unpushed work, rebasing on origin/{branch} instead of resetting")
+        sync_mode = 'ff-only'
+
+    if sync_mode == 'reset':
+        synced = run_git(repo_path, 'reset', '--hard', f"origin/{branch}")
+    else:
+        synced = run_git(repo_path, 'merge', '--ff-only', f"origin/{branch}")
+        if not synced:
+            synced = run_git(repo_path, 'rebase', f"origin/{branch}")
+            if not synced:
+                run_git(repo_path, 'rebase', '--abort')
+
+    if synced:
+        logging.info(f"Repository synced with origin/{branch}")
+    return synced
+
+
 def get_current_branch(repo_path):
     """
     Get the current branch of the given Git repository.
@@ -189,26 +284,64 @@ def get_branches(repo_path):
         return []
 
 
-def commit_file(file_path, access_token):
-    if len(access_token) > 0:
-        file_path_array = file_path.split("/")
-        dest_path = file_path_array[0]
-        file_name = '/'.join(file_path_array[1:])
+def commit_files(repo_path, file_names, commit_message):
+    """
+    Stage the given files, including deleted ones, and commit them together.
 
-        commit_message = "Updated " + file_name
+    :param repo_path: Path to the Git repository
+    :param file_names: Paths of the files relative to the repository
+    :param commit_message: Message of the commit
+    :return: True if the files were committed or had no changes, False if git failed
+    """
+    try:
+        # Paths neither on disk nor tracked (created and removed again within the batch) would fail git add
+        tracked = subprocess.run(['git', 'ls-files', '--'] + list(file_names), cwd=repo_path,
+                                 text=True, capture_output=True, check=True).stdout.splitlines()
+        file_names = [file_name for file_name in file_names
+                      if os.path.exists(os.path.join(repo_path, file_name))
+                      or any(path == file_name or path.startswith(file_name.rstrip('/') + '/') for path in tracked)]
+        if not file_names:
+            logging.info("Nothing to commit.")
+            return True
+
+        subprocess.run(['git', 'add', '-A', '--'] + file_names, cwd=repo_path,
+                       text=True, capture_output=True, check=True)
+
+        # Nothing staged, e.g. the files were written back unchanged
+        staged = subprocess.run(['git', 'diff', '--cached', '--quiet'], cwd=repo_path)
+        if staged.returncode == 0:
+            logging.info("Nothing to commit.")
+            return True
+
+        subprocess.run(['git', 'commit', '-m', commit_message], cwd=repo_path,
+                       text=True, capture_output=True, check=True)
+        logging.info(f"{len(file_names)} files committed successfully.")
+        return True
+    except subprocess.CalledProcessError as e:
+        logging.warning(f"Error while committing to repository: {e.stderr}")
+        return False
 
-        try:
-            # Add the file to the staging area
-            subprocess.run(['git', 'add', file_name], cwd=dest_path)
 
-            # Commit the changes
-            subprocess.run(['git', 'commit', '-m', commit_message], cwd=dest_path)
+def has_unsaved_work(repo_path, branch):
+    """
+    Check whether a working copy holds changes that only exist locally.
 
-            logging.info(f"File {file_name} committed successfully.")
-        except Exception as e:
-            logging.warning(f"Error while committing to repository: {e}")
-    else:
-        logging.warning(f"Access Code is not Present")
+    :param repo_path: Path to the Git repository
+    :param branch: Branch whose remote counterpart local commits are compared with
+    :return: True if files are uncommitted or commits are not pushed, or if git cannot tell
+    """
+    try:
+        status = subprocess.run(['git', 'status', '--porcelain'], cwd=repo_path,
+                                text=True, capture_output=True, check=True).stdout
+        if status.strip():
+            return True
+        ahead = subprocess.run(['git', 'rev-list', '--count', f"origin/{branch}..HEAD"], cwd=repo_path,
+                               text=True, capture_output=True)
+        # Without a remote branch to compare with, every local commit is unpushed
+        return ahead.returncode != 0 or int(ahead.stdout.strip() or 0) > 0
+    except (subprocess.CalledProcessError, OSError, ValueError) as e:
+        logging.warning(f"Cannot read the state of {repo_path}: {e}")
+        return True
 
 
 def push_to_repo(repo_url, branch, dest_path, access_token):
@@ -221,10 +354,15 @@ def push_to_repo(repo_url, branch, dest_path, access_token):
 
         try:
             # Push to the remote repository using the access token
-            subprocess.run(['git', 'push', protocol + '://oauth2:' + password + '@' + url, branch], cwd=dest_path)
+            subprocess.run(['git', 'push', protocol + '://oauth2:' + password + '@' + url, branch], cwd=dest_path,
+                           text=True, capture_output=True, check=True)
 
             logging.info("Changes Pushed successfully.")
-        except Exception as e:
-            logging.warning(f"Error while pushing to repository: {e}")
+            return True
+        except subprocess.CalledProcessError as e:
+            # The command holds the access token, only the output is logged
+            logging.warning(f"Error while pushing to repository: {e.stderr.replace(password, '***')}")
+            return False
     else:
         logging.warning(f"Access Code is not Present")
+        return False
@@ -0,0 +1,217 @@
+import logging
+
+from sqlalchemy import delete, insert, update
+
+import database_utility
+import intellisense
+import search
+from models import Sheet, SheetSection, SheetSectionItem, SheetSectionItemResponse, Playlist, PlaylistSection, \
+    PlaylistItem
+
+# Configure the logging settings
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+)
+
+# Format of the payloads written by the marketplace export
+payload_format = 'columnar-v1'
+
+# Models of an imported tree, with the column linking each level to its parent
+import_trees = {
+    'sheet': {
+        'record': Sheet,
+        'section': SheetSection,
+        'section_parent': SheetSection.sheet_uid,
+        'item': SheetSectionItem,
+        'item_parent': SheetSectionItem.sheet_section_uid
+    },
+    'playlist': {
+        'record': Playlist,
+        'section': PlaylistSection,
+        'section_parent': PlaylistSection.playlist_uid,
+        'item': PlaylistItem,
+        'item_parent': PlaylistItem.section_uid
+    }
+}
+
+# Columns taken from the payload, the progress of the user (status and completed counts) is never overwritten
+import_columns = {
+    Sheet: ['name', 'description', 'url', 'image', 'total_items_count'],
+    SheetSection: ['sheet_uid', 'name', 'description'],
+    SheetSectionItem: ['sheet_section_uid', 'name', 'url', 'description', 'level', 'companies', 'concepts',
+                       'frequency'],
+    Playlist: ['title', 'description', 'total_items_count'],
+    PlaylistSection: ['playlist_uid', 'title', 'description'],
+    PlaylistItem: ['section_uid', 'title', 'description', 'image', 'url', 'content', 'content_type']
+}
+
+# Item columns the problem matching of intellisense depends on
+match_columns = ['name', 'url']
+
+
+def validate_payload(payload):
+    # Error message for a payload that cannot be imported, None when it is valid
+    if not isinstance(payload, dict):
+        return "Payload must be a JSON object"
+    if payload.get('format') != payload_format:
+        return f"Unsupported payload format: {payload.get('format')}"
+    if payload.get('kind') not in import_trees:
+        return f"Unknown import kind: {payload.get('kind')}"
+    if not payload.get('uid') or not isinstance(payload.get('record'), dict):
+        return "Payload has no uid or record"
+    for block in ('sections', 'items'):
+        table = payload.get(block)
+        if not isinstance(table, dict) or 'uid' not in (table.get('columns') or []) \
+                or not isinstance(table.get('rows'), list):
+            return f"Payload block '{block}' must have columns (with uid) and rows"
+        width = len(table['columns'])
+        for position, row in enumerate(table['rows']):
+            if not isinstance(row, list) or len(row) != width:
+                return f"Row {position} of block '{block}' must have {width} values"
+    return None
+
+
+def read_table(table, model):
+    """
+    Turn a columnar block ({"columns": [...], "rows": [[...], ...]}) into row dictionaries.
+
+    Only uid and the import columns of the model are kept, columns missing from the block are left untouched.
+
+    :param table: Columnar block of the payload
+    :param model: Model the rows belong to
+    :return: Tuple of the imported column names and the list of rows
+    """
+    names = table['columns']
+    columns = [name for name in import_columns[model] if name in names]
+    positions = [names.index(name) for name in ['uid'] + columns]
+    keys = ['uid'] + columns
+    return columns, [{key: row[position] for key, position in zip(keys, positions)} for row in table['rows']]
+
+
+def diff_rows(existing, rows, columns):
+    """
+    Compare the stored rows of a level with the imported ones.
+
+    :param existing: Stored rows with id, uid and the imported columns
+    :param rows: Imported row dictionaries
+    :param columns: Imported column names
+    :return: Tuple of the rows to insert, the rows to update (with their id) and the uids to delete
+    """
+    current = {row.uid: row for row in existing}
+    inserts = []
+    updates = []
+    for row in rows:
+        stored = current.pop(row['uid'], None)
+        if stored is None:
+            inserts.append(row)
+        elif any(getattr(stored, column) != row[column] for column in columns):
+            updates.append(dict(row, id=stored.id))
+    return inserts, updates, list(current)
+
+
+def import_tree(payload):
+    """
+    Upsert an imported sheet or playlist, with its sections and items, from a columnar marketplace payload.
+
+    Only the rows that changed are written: new rows are inserted, changed rows updated in place and rows missing
+    from the payload deleted. Existing sections and items keep their status, so the progress of the user survives a
+    re-import. For sheets, intellisense only matches the new items and the items whose name or url changed.
+
+    :param payload: Payload built by the marketplace export, checked with validate_payload
+    :return: Dictionary with the number of inserted, updated and deleted rows
+    """
+    error = validate_payload(payload)
+    if error is not None:
+        raise ValueError(error)
+
+    kind = payload['kind']
+    uid = payload['uid']
+    tree = import_trees[kind]
+    record_model, section_model, item_model = tree['record'], tree['section'], tree['item']
+
+    record_columns = [name for name in import_columns[record_model] if name in payload['record']]
+    record = dict({name: payload['record'][name] for name in record_columns}, uid=uid)
+    section_columns, sections = read_table(payload['sections'], section_model)
+    item_columns, items = read_table(payload['items'], item_model)
+
+    section_uids = {section['uid'] for section in sections}
+    parent_key = tree['section_parent'].key
+    item_parent_key = tree['item_parent'].key
+    # Sections always belong to the imported record, whatever the payload says
+    section_columns = [name for name in section_columns if name != parent_key]
+    for section in sections:
+        section[parent_key] = uid
+    for item in items:
+        if item.get(item_parent_key) not in section_uids:
+            raise ValueError(f"Item {item['uid']} belongs to no section of {kind} {uid}")
+
+    connector = database_utility.create_connection()
+    try:
+        # The stored tree, read before anything is written so items of deleted sections are still found
+        stored_record = connector.query(record_model.id, record_model.uid,
+                                        *[getattr(record_model, name) for name in record_columns]) \
+            .filter(record_model.uid == uid).all()
+        stored_sections = connector.query(section_model.id, section_model.uid,
+                                          *[getattr(section_model, name) for name in section_columns]) \
+            .filter(tree['section_parent'] == uid).all()
+        stored_items = connector.query(item_model.id, item_model.uid,
+                                       *[getattr(item_model, name) for name in item_columns]) \
+            .join(section_model, tree['item_parent'] == section_model.uid) \
+            .filter(tree['section_parent'] == uid).all()
+
+        record_inserts, record_updates, _ = diff_rows(stored_record, [record], record_columns)
+        section_inserts, section_updates, section_deletes = diff_rows(stored_sections, sections, section_columns)
+        item_inserts, item_updates, item_deletes = diff_rows(stored_items, items, item_columns)
+
+        # Parents are written before their children and deleted after them
+        if record_inserts:
+            connector.execute(insert(record_model), record_inserts)
+        if record_updates:
+            connector.execute(update(record_model), record_updates)
+        if section_inserts:
+            connector.execute(insert(section_model), section_inserts)
+        if section_updates:
+            connector.execute(update(section_model), section_updates)
+        if item_deletes:
+            if kind == 'sheet':
+                connector.execute(delete(SheetSectionItemResponse).where(
+                    SheetSectionItemResponse.sheet_section_item_id.in_(item_deletes)))
+            connector.execute(delete(item_model).where(item_model.uid.in_(item_deletes)))
+        if item_inserts:
+            connector.execute(insert(item_model), item_inserts)
+        if item_updates:
+            connector.execute(update(item_model), item_updates)
+        if section_deletes:
+            connector.execute(delete(section_model).where(section_model.uid.in_(section_deletes)))
+
+        if kind == 'sheet':
+            stored_by_uid = {item.uid: item for item in stored_items}
+            rematch = [item['uid'] for item in item_inserts] + [
+                item['uid'] for item in item_updates
+                if any(name in item_columns and getattr(stored_by_uid[item['uid']], name) != item[name]
+                       for name in match_columns)]
+            intellisense.match_sheet_items(connector, rematch)
+        connector.commit()
+
+        counts = {
+            'inserted': len(record_inserts) + len(section_inserts) + len(item_inserts),
+            'updated': len(record_updates) + len(section_updates) + len(item_updates),
+            'deleted': len(section_deletes) + len(item_deletes)
+        }
+
+        # Completion counts follow the statuses kept, matched or deleted above
+        if kind == 'sheet':
+            intellisense.run_sheet_update(connector, uid)
+            if item_inserts or item_updates or item_deletes:
+                search.index_sheet_items(connector, uid)
+        else:
+            intellisense.run_playlist_update(connector, uid)
+
+        logging.info(f"Imported {kind} {uid}: {counts}")
+        return counts
+    except Exception:
+        connector.rollback()
+        raise
+    finally:
+        database_utility.close_connection(connector)
@@ -1,10 +1,10 @@
 import logging
 
 import shortuuid
-from sqlalchemy import or_
+from sqlalchemy import or_, delete, insert, update
 
 import database_utility
-from models import Problem, SheetSectionItem, Sheet, Playlist
+from models import Problem, SheetSectionItem, SheetSectionItemResponse, Sheet, Playlist
 
 # Configure the logging settings
 logging.basicConfig(
@@ -31,24 +31,10 @@ def run_intellisense(connector):
                 problem.uid
             )
 
-            # For Explicit Status Assignment
-            if problem.sheet_item_status is not None:
-                status_change_list.append({
-                    'id': item.uid,
-                    'status': problem.sheet_item_status
-                })
-            else:
-                status_precompute = str(problem.status).lower()
-                status = 'TODO'
-                if "pending" in status_precompute or "to be done" in status_precompute or "working on it" in status_precompute:
-                    status = 'INPROGRESS'
-                elif "complete" in status_precompute or "done" in status_precompute:
-                    status = 'COMPLETED'
-
-                status_change_list.append({
-                    'id': item.uid,
-                    'status': status
-                })
+            status_change_list.append({
+                'id': item.uid,
+                'status': get_sheet_item_status(problem)
+            })
             values_list.append(values)
 
     if len(values_list) > 0:
@@ -58,6 +44,55 @@ def run_intellisense(connector):
         run_sheet_update(connector)
 
 
+def get_sheet_item_status(problem):
+    # For Explicit Status Assignment
+    if problem.sheet_item_status is not None:
+        return problem.sheet_item_status
+
+    status_precompute = str(problem.status).lower()
+    if "pending" in status_precompute or "to be done" in status_precompute or "working on it" in status_precompute:
+        return 'INPROGRESS'
+    elif "complete" in status_precompute or "done" in status_precompute:
+        return 'COMPLETED'
+    return 'TODO'
+
+
+def match_sheet_items(connector, item_uids):
+    """
+    Link the given sheet items to the problems they match, with the rules of run_intellisense applied to these items
+    only, and return the number of responses saved. The caller commits.
+
+    :param connector: Database session
+    :param item_uids: Uids of the sheet items to match, their previous responses are replaced
+    """
+    if not item_uids:
+        return 0
+    connector.execute(delete(SheetSectionItemResponse).where(
+        SheetSectionItemResponse.sheet_section_item_id.in_(item_uids)))
+
+    items = connector.query(SheetSectionItem.id, SheetSectionItem.uid, SheetSectionItem.name,
+                            SheetSectionItem.url).filter(SheetSectionItem.uid.in_(item_uids)).all()
+    problems = connector.query(Problem.uid, Problem.name, Problem.url, Problem.status,
+                               Problem.sheet_item_status).filter(Problem.include_count == True).all()
+    responses = []
+    statuses = {}
+    for problem in problems:
+        # Same test as the name = ? OR url LIKE '%<url>%' query, LIKE ignores the case of ASCII letters
+        url = str(problem.url).lower()
+        for item in items:
+            if item.name == problem.name or (item.url is not None and url in item.url.lower()):
+                responses.append({'uid': shortuuid.uuid(), 'sheet_section_item_id': item.uid, 'problem_id': problem.uid})
+                # The last matching problem wins, like in run_intellisense
+                statuses[item.id] = get_sheet_item_status(problem)
+
+    if responses:
+        connector.execute(insert(SheetSectionItemResponse), responses)
+        connector.execute(update(SheetSectionItem), [{'id': item_id, 'status': status}
+                                                     for item_id, status in statuses.items()])
+    logging.info(f"{len(responses)} Problems Found for {len(items)} Sheet Items...........")
+    return len(responses)
+
+
 def save_intellisense_response(connector, values_list):
     logging.info(f"Saving Intellisense Responses...........")
     # Insert if Problems Similarity is Detected
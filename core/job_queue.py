@@ -0,0 +1,271 @@
+import json
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, DateTime, Index, func
+from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import NullPool
+
+from config_manager import config_manager as appenv
+
+# Configure the logging settings
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+)
+
+# The queue lives in its own database, codebase.db is replaced on every re-index
+database = "jobs.db"
+if "JOB_DATABASE_NAME" in appenv.environ:
+    database = appenv.environ["JOB_DATABASE_NAME"] + ".db"
+
+JobBase = declarative_base()
+
+# Jobs of a group that may run at the same time, groups not listed run one at a time
+group_limits = {
+    'repo': 1,
+    'mail': 1,
+    'default': 2
+}
+
+# Seconds before a failed job is retried, doubled on every attempt
+retry_delay = 30
+
+# Days finished jobs are kept for
+retention_days = 7
+
+
+class Job(JobBase):
+    __tablename__ = 'jobs'
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text)
+    group = Column(String, nullable=False, default='default')
+    status = Column(String, nullable=False, default='QUEUED')
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    error = Column(Text)
+    result = Column(Text)
+    run_at = Column(DateTime, nullable=False, default=datetime.now)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    status_run_at_index = Index('idx_jobs_status_run_at', status, run_at)
+    kind_status_index = Index('idx_jobs_kind_status', kind, status)
+
+    def get_payload(self):
+        return json.loads(self.payload) if self.payload else {}
+
+    def get_result(self):
+        return json.loads(self.result) if self.result else None
+
+    def __response_json__(self, include_payload=False):
+        # The payload can be large (a whole imported catalogue), status polls only get it when asked for
+        response = {
+            'id': self.id,
+            'kind': self.kind,
+            'group': self.group,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'error': self.error,
+            'result': self.get_result(),
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+        if include_payload:
+            response['payload'] = self.get_payload()
+        return response
+
+
+def on_connect(dbapi_connection, connection_record):
+    # Transactions are started by on_begin, WAL lets the web workers enqueue while the worker claims
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+def on_begin(connection):
+    # Writers take the write lock up front so two processes never claim the same job, readers (status polls) start a
+    # deferred transaction that never waits for it
+    if connection.get_execution_options().get('read_only'):
+        connection.exec_driver_sql("BEGIN")
+    else:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+# No pooling, the engine is created before gunicorn forks and SQLite connections must not cross processes
+engine = create_engine(f'sqlite:///{database}', poolclass=NullPool, connect_args={'timeout': 30})
+event.listen(engine, 'connect', on_connect)
+event.listen(engine, 'begin', on_begin)
+Session = sessionmaker(bind=engine)
+ReadSession = sessionmaker(bind=engine.execution_options(read_only=True))
+JobBase.metadata.create_all(engine)
+
+
+def add_missing_columns():
+    # create_all leaves existing tables alone, columns added since the queue database was created are added here
+    with engine.connect() as connection:
+        existing = {row[1] for row in connection.exec_driver_sql("PRAGMA table_info(jobs)")}
+        for column in Job.__table__.columns:
+            if column.name not in existing:
+                connection.exec_driver_sql(f'ALTER TABLE jobs ADD COLUMN "{column.name}" '
+                                           f'{column.type.compile(engine.dialect)}')
+        connection.commit()
+
+
+add_missing_columns()
+
+
+def enqueue(kind, payload=None, group='default', max_attempts=3, delay=0):
+    """
+    Add a job to the queue and return its id.
+
+    :param kind: Kind of the job, one of the worker handlers
+    :param payload: JSON serializable arguments of the job
+    :param group: Concurrency group of the job
+    :param max_attempts: Number of runs before the job is marked as failed
+    :param delay: Seconds to wait before the job may run
+    """
+    session = Session()
+    try:
+        job = Job(kind=kind, payload=json.dumps(payload or {}), group=group, max_attempts=max_attempts,
+                  run_at=datetime.now() + timedelta(seconds=delay))
+        session.add(job)
+        session.commit()
+        logging.info(f"Job {job.id} ({kind}) enqueued")
+        return job.id
+    finally:
+        session.close()
+
+
+def enqueue_batch(kind, key, items, group='default', delay=0, max_delay=None):
+    """
+    Add items to the queued job of a kind, or enqueue a new one, and return the job id.
+
+    The run of the queued job is pushed back by delay seconds on every call, so a burst of calls ends up in one job,
+    but never past max_delay seconds after the job was created.
+
+    :param kind: Kind of the job, one of the worker handlers
+    :param key: Payload key holding the list of items
+    :param items: Items to add to the list, duplicates are dropped
+    :param group: Concurrency group of the job
+    :param delay: Seconds to wait after the last call before the job may run
+    :param max_delay: Seconds a job may be pushed back for in total, None for no limit
+    """
+    session = Session()
+    try:
+        now = datetime.now()
+        job = session.query(Job).filter(Job.kind == kind, Job.status == 'QUEUED').order_by(Job.id).first()
+        if job is None:
+            job = Job(kind=kind, payload=json.dumps({key: list(dict.fromkeys(items))}), group=group,
+                      run_at=now + timedelta(seconds=delay))
+            session.add(job)
+        else:
+            payload = job.get_payload()
+            payload[key] = list(dict.fromkeys(payload.get(key, []) + list(items)))
+            job.payload = json.dumps(payload)
+            run_at = now + timedelta(seconds=delay)
+            if max_delay is not None:
+                run_at = min(run_at, job.created_at + timedelta(seconds=max_delay))
+            job.run_at = max(job.run_at, run_at)
+        session.commit()
+        return job.id
+    finally:
+        session.close()
+
+
+def get_latest(kind, statuses, include_payload=False):
+    # Most recent job of a kind in one of the statuses
+    session = ReadSession()
+    try:
+        job = session.query(Job).filter(Job.kind == kind, Job.status.in_(statuses)).order_by(Job.id.desc()).first()
+        return job.__response_json__(include_payload) if job else None
+    finally:
+        session.close()
+
+
+def claim():
+    # Returns the next runnable job, marked as RUNNING, whose group is below its concurrency limit
+    session = Session()
+    try:
+        running = dict(session.query(Job.group, func.count(Job.id)).filter(Job.status == 'RUNNING')
+                       .group_by(Job.group).all())
+        candidates = session.query(Job).filter(Job.status == 'QUEUED', Job.run_at <= datetime.now()) \
+            .order_by(Job.run_at, Job.id).limit(50).all()
+        for job in candidates:
+            if running.get(job.group, 0) < group_limits.get(job.group, 1):
+                job.status = 'RUNNING'
+                job.attempts += 1
+                session.commit()
+                session.refresh(job)
+                session.expunge(job)
+                return job
+        session.rollback()
+        return None
+    finally:
+        session.close()
+
+
+def complete(job_id, result=None):
+    # result is what the handler returned, stored as JSON for the status handle
+    session = Session()
+    try:
+        session.query(Job).filter(Job.id == job_id).update({
+            'status': 'DONE',
+            'error': None,
+            'result': json.dumps(result) if result is not None else None
+        })
+        session.commit()
+    finally:
+        session.close()
+
+
+def fail(job_id, error):
+    session = Session()
+    try:
+        job = session.query(Job).filter(Job.id == job_id).first()
+        if job.attempts < job.max_attempts:
+            job.status = 'QUEUED'
+            job.run_at = datetime.now() + timedelta(seconds=retry_delay * 2 ** (job.attempts - 1))
+        else:
+            job.status = 'FAILED'
+        job.error = str(error)
+        session.commit()
+        logging.warning(f"Job {job.id} ({job.kind}) failed, attempt {job.attempts}/{job.max_attempts}: {error}")
+    finally:
+        session.close()
+
+
+def recover():
+    # Jobs left RUNNING by a stopped worker are queued again, finished jobs past retention are removed
+    session = Session()
+    try:
+        recovered = session.query(Job).filter(Job.status == 'RUNNING').update({'status': 'QUEUED'})
+        session.query(Job).filter(Job.status.in_(['DONE', 'FAILED']),
+                                  Job.updated_at < datetime.now() - timedelta(days=retention_days)).delete()
+        session.commit()
+        if recovered:
+            logging.info(f"{recovered} interrupted jobs queued again")
+    finally:
+        session.close()
+
+
+def is_pending(kind):
+    session = ReadSession()
+    try:
+        return session.query(Job.id).filter(Job.kind == kind, Job.status.in_(['QUEUED', 'RUNNING'])).first() is not None
+    finally:
+        session.close()
+
+
+def get_job(job_id):
+    session = ReadSession()
+    try:
+        job = session.query(Job).filter(Job.id == job_id).first()
+        return job.__response_json__() if job else None
+    finally:
+        session.close()
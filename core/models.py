@@ -64,6 +64,7 @@ class Problem(Base):
     name_index = Index('idx_problems_name', name)
     remarks_index = Index('idx_problems_remarks', remarks)
     levels_index = Index('idx_problems_level', level)
+    date_added_index = Index('idx_problems_date_added', date_added)
 
     @classmethod
     def from_json(cls, data):
@@ -86,27 +87,87 @@ class Problem(Base):
             include_count=data.get('include_count', True)
         )
 
-    def __response_json__(self, include_RR=False):
-        obj = {
-            'id': self.uid,
-            'name': self.name,
-            'slug': utility.create_slug(self.name),
-            'type': self.type.__response_json__(include_RR),
-            'description': self.description,
-            'url': self.url,
-            'level': self.level,
-            'status': self.status,
-            'notes': self.notes,
-            'date': str(self.date_added),
-            'filename': self.filename,
-            'companies': self.companies,
-            'remarks': self.remarks,
-            'sheet_item_status':self.sheet_item_status,
-            'subdirectory': self.subdirectory
+    # Columns required by each key of the response, used for load_only projections
+    response_columns = {
+        'id': ['uid'],
+        'name': ['name'],
+        'slug': ['name'],
+        'type': ['typeid'],
+        'description': ['description'],
+        'url': ['url'],
+        'level': ['level'],
+        'status': ['status'],
+        'notes': ['notes'],
+        'date': ['date_added'],
+        'filename': ['filename'],
+        'companies': ['companies'],
+        'remarks': ['remarks'],
+        'sheet_item_status': ['sheet_item_status'],
+        'subdirectory': ['subdirectory']
+    }
+
+    @classmethod
+    def load_columns(cls, fields):
+        columns = {column for field in fields for column in cls.response_columns[field]}
+        return [getattr(cls, column.key) for column in cls.__table__.columns if column.key in columns]
+
+    def __response_json__(self, include_RR=False, fields=None):
+        serializers = {
+            'id': lambda: self.uid,
+            'name': lambda: self.name,
+            'slug': lambda: utility.create_slug(self.name),
+            'type': lambda: self.type.__response_json__(include_RR),
+            'description': lambda: self.description,
+            'url': lambda: self.url,
+            'level': lambda: self.level,
+            'status': lambda: self.status,
+            'notes': lambda: self.notes,
+            'date': lambda: str(self.date_added),
+            'filename': lambda: self.filename,
+            'companies': lambda: self.companies,
+            'remarks': lambda: self.remarks,
+            'sheet_item_status': lambda: self.sheet_item_status,
+            'subdirectory': lambda: self.subdirectory
         }
+        obj = {key: serializer() for key, serializer in serializers.items() if fields is None or key in fields}
         return obj
 
 
+class DailyActivity(Base):
+    __tablename__ = 'daily_activity'
+
+    id = Column(Integer, primary_key=True)
+    date = Column(Date, nullable=False)
+    type = Column(String, nullable=False)
+    level = Column(String)
+    include_count = Column(Boolean, default=True, nullable=False)
+    count = Column(Integer, default=0, nullable=False)
+    problem_ids = Column(Text)
+
+    date_index = Index('idx_daily_activity_date', date)
+    type_index = Index('idx_daily_activity_type', type)
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            date=data.get('date', None),
+            type=data.get('type', None),
+            level=data.get('level', None),
+            include_count=data.get('include_count', True),
+            count=data.get('count', 0),
+            problem_ids=data.get('problem_ids', None)
+        )
+
+    def __response_json__(self):
+        return {
+            'date': self.date.strftime("%Y-%m-%d") if self.date else None,
+            'type': self.type,
+            'level': self.level,
+            'count': self.count,
+            'problems': [int(problem_id) for problem_id in str(self.problem_ids).split(":")] if self.problem_ids else []
+        }
+
+
 class Platform(Base):
     __tablename__ = 'platforms'
 
@@ -282,11 +343,13 @@ class Reminder(Base):
     start_time = Column(Time)
     end_time = Column(Time)
     date = Column(Date)
+    next_fire_at = Column(DateTime)
 
     name_index = Index('idx_reminders_name', name)
     start_time_index = Index('idx_reminders_start_time', start_time)
     end_time_index = Index('idx_reminders_end_time', end_time)
     date_index = Index('idx_reminders_date', date)
+    next_fire_at_index = Index('idx_reminders_next_fire_at', next_fire_at)
 
     @classmethod
     def from_json(cls, data):
@@ -320,7 +383,8 @@ class Reminder(Base):
             'recurrence': self.recurrence,
             'start_time': self.start_time.strftime("%H:%M") if self.start_time else None,
             'end_time': self.end_time.strftime("%H:%M") if self.end_time else None,
-            'date': self.date.strftime("%Y-%m-%d") if self.date else None
+            'date': self.date.strftime("%Y-%m-%d") if self.date else None,
+            'next_fire_at': self.next_fire_at.isoformat() if self.next_fire_at else None
         }
 
     def __data_store__(self):
@@ -648,21 +712,41 @@ class Sheet(Base):
             updated_at=updated_at
         )
 
-    def __response_json__(self):
+    # Columns required by each key of the response, used for load_only projections
+    response_columns = {
+        'id': ['uid'],
+        'title': ['name'],
+        'description': ['description'],
+        'url': ['url'],
+        'image': ['image'],
+        'total_items': ['total_items_count'],
+        'completed_items': ['completed_items_count'],
+        'complete_percent': ['completed_items_count', 'total_items_count'],
+        'created_at': ['created_at'],
+        'updated_at': ['updated_at'],
+        'sections': ['uid']
+    }
 
-        return {
-            'id': self.uid,
-            'title': self.name,
-            'description': self.description,
-            'url': self.url,
-            'image': self.image,
-            'total_items': self.total_items_count,
-            'completed_items': self.completed_items_count,
-            'complete_percent': int((self.completed_items_count / self.total_items_count) * 100) if self.total_items_count > 0 else 0,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'sections': [section.__response_json__() for section in self.sections]
+    @classmethod
+    def load_columns(cls, fields):
+        columns = {column for field in fields for column in cls.response_columns[field]}
+        return [getattr(cls, column.key) for column in cls.__table__.columns if column.key in columns]
+
+    def __response_json__(self, fields=None):
+        serializers = {
+            'id': lambda: self.uid,
+            'title': lambda: self.name,
+            'description': lambda: self.description,
+            'url': lambda: self.url,
+            'image': lambda: self.image,
+            'total_items': lambda: self.total_items_count,
+            'completed_items': lambda: self.completed_items_count,
+            'complete_percent': lambda: int((self.completed_items_count / self.total_items_count) * 100) if self.total_items_count > 0 else 0,
+            'created_at': lambda: self.created_at.isoformat() if self.created_at else None,
+            'updated_at': lambda: self.updated_at.isoformat() if self.updated_at else None,
+            'sections': lambda: [section.__response_json__() for section in self.sections]
         }
+        return {key: serializer() for key, serializer in serializers.items() if fields is None or key in fields}
 
 
 class SheetSection(Base):
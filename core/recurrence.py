@@ -0,0 +1,123 @@
+import calendar
+import heapq
+import logging
+from datetime import datetime, timedelta, time
+
+from config_manager import config_manager as appenv
+from models import Reminder
+
+# Configure the logging settings
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+)
+
+weekdays = ['MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY', 'FRIDAY', 'SATURDAY', 'SUNDAY']
+
+
+def parse_recurrence(recurrence):
+    # "EVERY MONDAY" (or "EVERY MONDAY,FRIDAY") carries its week days after the type
+    parts = str(recurrence or '').replace(',', ' ').upper().split()
+    if not parts or parts[0] not in appenv.recurrence_types:
+        return None, []
+    return parts[0], [weekdays.index(day) for day in parts[1:] if day in weekdays]
+
+
+def next_weekday(after, at, days):
+    for offset in range(8):
+        candidate = datetime.combine(after.date() + timedelta(days=offset), at)
+        if candidate.weekday() in days and candidate > after:
+            return candidate
+    return None
+
+
+def next_monthday(after, at, day):
+    year, month = after.year, after.month
+    for _ in range(13):
+        candidate = datetime.combine(after.date().replace(year=year, month=month,
+                                                          day=min(day, calendar.monthrange(year, month)[1])), at)
+        if candidate > after:
+            return candidate
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return None
+
+
+def next_fire_at(recurrence, start_time, date, after):
+    """
+    Compute the first occurrence of a reminder strictly after a given moment, None if it never fires again.
+
+    WEEKLY repeats on the week day of the reminder date and MONTHLY on its day of month, Monday and the first of the
+    month when the reminder has no date.
+
+    :param recurrence: Recurrence of the reminder, one of ConfigManager.recurrence_types
+    :param start_time: Time of the day the reminder fires at, midnight when missing
+    :param date: Date of the reminder
+    :param after: Moment to compute the next occurrence from
+    """
+    kind, days = parse_recurrence(recurrence)
+    at = start_time or time(0, 0)
+
+    if kind == 'ONCE':
+        if date is None:
+            return None
+        candidate = datetime.combine(date, at)
+        return candidate if candidate > after else None
+    elif kind == 'DAILY':
+        return next_weekday(after, at, range(7))
+    elif kind == 'WEEKLY':
+        return next_weekday(after, at, [date.weekday() if date else 0])
+    elif kind == 'EVERY':
+        return next_weekday(after, at, days) if days else None
+    elif kind == 'MONTHLY':
+        return next_monthday(after, at, date.day if date else 1)
+
+    logging.warning(f"Unknown recurrence: {recurrence}")
+    return None
+
+
+def upcoming_reminders(connector, now, until=None):
+    """
+    Return (fire_at, reminder) pairs of the reminders firing after now (and until, when given), soonest first.
+
+    :param connector: Database session
+    :param now: Current moment
+    :param until: End of the window, None for no limit
+    """
+    # Index range scan on next_fire_at
+    query = connector.query(Reminder).filter(Reminder.next_fire_at > now)
+    if until is not None:
+        query = query.filter(Reminder.next_fire_at <= until)
+    upcoming = [(reminder.next_fire_at, reminder) for reminder in query.all()]
+
+    # Reminders that fired but were not moved to their next occurrence by the scheduler yet
+    for reminder in connector.query(Reminder).filter(Reminder.next_fire_at <= now).all():
+        fire_at = next_fire_at(reminder.recurrence, reminder.start_time, reminder.date, now)
+        if fire_at is not None and (until is None or fire_at <= until):
+            upcoming.append((fire_at, reminder))
+    return sorted(upcoming, key=lambda entry: entry[0])
+
+
+def build_heap(connector, until):
+    # Heap of (next_fire_at, id, reminder) for the reminders firing before until
+    reminders = connector.query(Reminder).filter(Reminder.next_fire_at <= until).all()
+    heap = [(reminder.next_fire_at, reminder.id, reminder) for reminder in reminders]
+    heapq.heapify(heap)
+    return heap
+
+
+def pop_due(heap, now):
+    """
+    Pop the reminders due at a given moment and push their next occurrence back on the heap.
+
+    :param heap: Heap built by build_heap
+    :param now: Current moment
+    """
+    due = []
+    while heap and heap[0][0] <= now:
+        fire_at, reminder_id, reminder = heapq.heappop(heap)
+        due.append(reminder)
+        # Computed from now so a reminder missed several times is only due once
+        reminder.next_fire_at = next_fire_at(reminder.recurrence, reminder.start_time, reminder.date, now)
+        if reminder.next_fire_at is not None:
+            heapq.heappush(heap, (reminder.next_fire_at, reminder_id, reminder))
+    return due
@@ -1,10 +1,12 @@
 import logging
+import multiprocessing
 import sys
 
 from gunicorn.app.base import BaseApplication
 
 import application_updator
-from codebase import app, port
+import worker
+from codebase import app, cache, port
 
 # Configure the logging settings
 logging.basicConfig(
@@ -23,6 +25,9 @@ class FlaskApplication(BaseApplication):
         self.options = options or {}
         self.application = app
         application_updator.init_system()
+        cache.invalidate_all()
+        # One persistent worker runs the queued jobs (mails, re-indexes, git pushes) for all the web workers
+        multiprocessing.Process(target=worker.run_worker, daemon=True).start()
         super().__init__()
 
     def load_config(self):
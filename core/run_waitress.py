@@ -1,8 +1,10 @@
 import logging
+import multiprocessing
 import sys
 from waitress import serve
 import application_updator
-from codebase import app, port
+import worker
+from codebase import app, cache, port
 
 # Configure the logging settings
 logging.basicConfig(
@@ -18,6 +20,9 @@ app.logger.addHandler(flask_log_handler)
 
 def run_server():
     application_updator.init_system()
+    cache.invalidate_all()
+    # One persistent worker runs the queued jobs (mails, re-indexes, git pushes)
+    multiprocessing.Process(target=worker.run_worker, daemon=True).start()
     serve(app, host='0.0.0.0', port=port, threads=10)
 
 
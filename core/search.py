@@ -0,0 +1,186 @@
+import logging
+import os
+import re
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import utility
+from models import Problem, ProblemType, Note, NoteItem, SheetSection, SheetSectionItem
+
+# Configure the logging settings
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+)
+
+kinds = ('problem', 'note', 'sheet-item')
+
+# Note files whose contents are indexed, larger files are indexed by their name only
+note_extensions = ('.md', '.markdown', '.txt', '.rst')
+max_note_size = 512 * 1024
+
+# Columns: kind (problem, note, sheet-item), ref (uid of the row), parent (type, note or sheet uid), title, body
+create_index_query = text("CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING "
+                          "fts5(kind UNINDEXED, ref UNINDEXED, parent UNINDEXED, title, body, "
+                          "tokenize = 'porter unicode61')")
+insert_query = text("INSERT INTO search_index (kind, ref, parent, title, body) "
+                    "VALUES (:kind, :ref, :parent, :title, :body)")
+delete_query = text("DELETE FROM search_index WHERE kind = :kind")
+delete_parent_query = text("DELETE FROM search_index WHERE kind = :kind AND parent = :parent")
+
+# Title matches weigh more than body matches, the unindexed columns get no weight
+search_query = """
+    SELECT kind, ref, parent, title,
+           snippet(search_index, 4, '<mark>', '</mark>', '...', 16) AS snippet,
+           bm25(search_index, 0.0, 0.0, 0.0, 10.0, 1.0) AS rank
+    FROM search_index
+    WHERE search_index MATCH :query {kind_filter}
+    ORDER BY rank
+    LIMIT :limit
+"""
+
+
+class SearchUnavailable(Exception):
+    pass
+
+
+def create_search_index(connector):
+    try:
+        connector.execute(create_index_query)
+        connector.commit()
+        return True
+    except OperationalError as e:
+        # SQLite builds without FTS5 cannot create the table, search is disabled
+        logging.warning(f"Search index is not available: {e}")
+        connector.rollback()
+        return False
+
+
+def join_text(*values):
+    return "\n".join(str(value).replace(":", " ") for value in values if value)
+
+
+def index_rows(connector, kind, rows, parent=None):
+    if not create_search_index(connector):
+        return
+    if parent is None:
+        connector.execute(delete_query, {'kind': kind})
+    else:
+        connector.execute(delete_parent_query, {'kind': kind, 'parent': parent})
+    if rows:
+        connector.execute(insert_query, rows)
+    connector.commit()
+    logging.info(f"Search Index updated with {len(rows)} {kind} rows")
+
+
+def index_problems(connector):
+    problems = connector.query(Problem.uid, ProblemType.name, Problem.name, Problem.description, Problem.concepts,
+                               Problem.notes, Problem.remarks, Problem.companies).join(
+        ProblemType, Problem.typeid == ProblemType.id).all()
+    rows = [{
+        'kind': 'problem',
+        'ref': uid,
+        'parent': type_name,
+        'title': name,
+        'body': join_text(description, concepts, notes, remarks, companies)
+    } for uid, type_name, name, description, concepts, notes, remarks, companies in problems]
+    index_rows(connector, 'problem', rows)
+
+
+def read_note(file_path):
+    if not file_path.lower().endswith(note_extensions) or not os.path.isfile(file_path):
+        return None
+    if os.path.getsize(file_path) > max_note_size:
+        return None
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
+        return file.read()
+
+
+def index_notes(connector, repo_path):
+    items = connector.query(NoteItem.uid, NoteItem.filename, Note.uid, Note.title).join(
+        Note, NoteItem.note_id == Note.id).all()
+    rows = []
+    for uid, filename, note_uid, note_title in items:
+        try:
+            content = read_note(filename.replace("<repo_path>", repo_path))
+        except OSError as e:
+            logging.warning(f"Cannot index note {filename}: {e}")
+            content = None
+        rows.append({
+            'kind': 'note',
+            'ref': uid,
+            'parent': note_uid,
+            'title': f"{note_title} {os.path.basename(filename)}",
+            'body': content or ''
+        })
+    index_rows(connector, 'note', rows)
+
+
+def remove_note(connector, note_uid):
+    """
+    Drop the indexed files of a note, in the transaction of the caller which commits.
+
+    :param connector: Database session
+    :param note_uid: Uid of the deleted note
+    """
+    try:
+        # Savepoint so a database without the search index keeps the rest of the transaction
+        with connector.begin_nested():
+            connector.execute(delete_parent_query, {'kind': 'note', 'parent': note_uid})
+    except OperationalError as e:
+        logging.warning(f"Search index is not available: {e}")
+
+
+def index_sheet_items(connector, sheet_uid=None):
+    query = connector.query(SheetSectionItem.uid, SheetSection.sheet_uid, SheetSectionItem.name,
+                            SheetSectionItem.description, SheetSectionItem.concepts,
+                            SheetSectionItem.companies).join(SheetSection,
+                                                             SheetSectionItem.sheet_section_uid == SheetSection.uid)
+    if sheet_uid is not None:
+        query = query.filter(SheetSection.sheet_uid == sheet_uid)
+    rows = [{
+        'kind': 'sheet-item',
+        'ref': uid,
+        'parent': parent,
+        'title': name,
+        'body': join_text(description, concepts, companies)
+    } for uid, parent, name, description, concepts, companies in query.all()]
+    index_rows(connector, 'sheet-item', rows, sheet_uid)
+
+
+def make_match_query(query):
+    # Every word is matched as a quoted term so user input cannot break the FTS5 syntax, the last one as a prefix
+    words = re.findall(r"\w+", query, flags=re.UNICODE)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] = terms[-1] + "*"
+    return " ".join(terms)
+
+
+def search(connector, query, kind=None, limit=20):
+    match_query = make_match_query(query)
+    if match_query is None:
+        return []
+
+    params = {'query': match_query, 'limit': limit}
+    kind_filter = ""
+    if kind is not None:
+        kind_filter = "AND kind = :kind"
+        params['kind'] = kind
+
+    try:
+        results = connector.execute(text(search_query.format(kind_filter=kind_filter)), params).all()
+    except OperationalError as e:
+        raise SearchUnavailable(str(e))
+
+    return [{
+        'kind': kind,
+        'id': ref,
+        'parent': parent,
+        'title': title,
+        'slug': utility.create_slug(title) if kind == 'problem' else None,
+        'snippet': snippet,
+        'rank': round(rank, 4)
+    } for kind, ref, parent, title, snippet, rank in results]
@@ -0,0 +1,89 @@
+import hashlib
+import logging
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+from config_manager import config_manager as appenv
+
+# Rendered files by path, least recently used first: path -> (mtime_ns, size, etag, body)
+rendered = OrderedDict()
+rendered_bytes = 0
+lock = threading.Lock()
+
+# Files from this size on are scanned through mmap instead of being read into memory
+mmap_threshold = 1024 * 1024
+default_max_bytes = 64 * 1024 * 1024
+
+metadata_start = b'<metadata>'
+metadata_end = b'</metadata>'
+
+
+def get_max_bytes():
+    environ = appenv.environ or {}
+    return int(environ.get('CODE_CACHE_MAX_BYTES') or default_max_bytes)
+
+
+def strip_metadata(data, replacement):
+    # Same as re.sub(r'<metadata>.*?</metadata>', replacement, code, flags=re.DOTALL) on the raw bytes
+    parts = []
+    position = 0
+    while True:
+        start = data.find(metadata_start, position)
+        if start == -1:
+            break
+        end = data.find(metadata_end, start + len(metadata_start))
+        if end == -1:
+            break
+        parts.append(data[position:start])
+        parts.append(replacement)
+        position = end + len(metadata_end)
+    parts.append(data[position:])
+    return b''.join(parts)
+
+
+def read_code(file_path, size, replacement):
+    with open(file_path, 'rb') as file:
+        if size >= mmap_threshold:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                data = strip_metadata(mapped, replacement)
+        else:
+            data = strip_metadata(file.read(), replacement)
+    return data.decode('utf-8')
+
+
+def get_rendered(file_path, label, encode):
+    """
+    Return the ETag and the encoded response body of a source file, with its metadata block replaced by a label.
+
+    :param file_path: Absolute path of the file
+    :param label: Text that replaces the <metadata> block
+    :param encode: Function that turns the rendered code into the response body bytes
+    """
+    global rendered_bytes
+    stat = os.stat(file_path)
+    with lock:
+        entry = rendered.get(file_path)
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            rendered.move_to_end(file_path)
+            return entry[2], entry[3]
+
+    code = read_code(file_path, stat.st_size, label.encode('utf-8'))
+    body = encode(code)
+    etag = hashlib.md5(f"{file_path}:{stat.st_mtime_ns}:{stat.st_size}".encode('utf-8')).hexdigest()
+
+    max_bytes = get_max_bytes()
+    if len(body) <= max_bytes:
+        with lock:
+            previous = rendered.pop(file_path, None)
+            if previous is not None:
+                rendered_bytes -= len(previous[3])
+            rendered[file_path] = (stat.st_mtime_ns, stat.st_size, etag, body)
+            rendered_bytes += len(body)
+            while rendered_bytes > max_bytes:
+                _, evicted = rendered.popitem(last=False)
+                rendered_bytes -= len(evicted[3])
+    else:
+        logging.info(f"{file_path} is larger than the code cache, it is rendered on every request")
+    return etag, body
@@ -0,0 +1,57 @@
+import logging
+import os
+import time
+
+import database_utility as database
+import utility
+from models import NoteItem
+
+# Absolute path of every note file by NoteItem.uid, for the current data version
+paths = {}
+loaded_version = None
+checked_at = 0
+
+# Seconds between two checks of the data version
+refresh_interval = 30
+
+
+def load_paths(repo_path, version):
+    global paths, loaded_version
+    repo_root = os.path.abspath(utility.get_running_repo(repo_path))
+    conn = database.create_connection()
+    try:
+        items = conn.query(NoteItem.uid, NoteItem.filename).all()
+        paths = {uid: os.path.normpath(filename.replace("<repo_path>", repo_root)) for uid, filename in items}
+        loaded_version = version
+        logging.info(f"Loaded {len(paths)} note file paths for data version {version}")
+    finally:
+        database.close_connection(conn)
+
+
+def refresh(repo_path, get_version, force=False):
+    global checked_at
+    now = time.monotonic()
+    if force or loaded_version is None or now - checked_at > refresh_interval:
+        checked_at = now
+        try:
+            version = get_version()
+        except Exception as e:
+            logging.warning(f"Cannot read data version, keeping the loaded paths: {e}")
+            version = loaded_version
+        if loaded_version is None or version != loaded_version:
+            load_paths(repo_path, version)
+
+
+def get_path(uid, repo_path, get_version):
+    """
+    Return the absolute path of a note file, or None when the uid is unknown.
+
+    :param uid: NoteItem uid
+    :param repo_path: Path of the content repository
+    :param get_version: Function returning the current data version
+    """
+    refresh(repo_path, get_version)
+    if uid not in paths:
+        # The notes may have been re-indexed since the last check
+        refresh(repo_path, get_version, True)
+    return paths.get(uid)
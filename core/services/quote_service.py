@@ -0,0 +1,57 @@
+import hashlib
+import logging
+import random
+import time
+from datetime import date
+
+import database_utility as database
+from models import Quote
+
+# Quotes of the current data version, served from memory
+quotes = []
+loaded_version = None
+checked_at = 0
+
+# Seconds between two checks of the data version
+refresh_interval = 30
+
+
+def load_quotes(version):
+    global quotes, loaded_version
+    conn = database.create_connection()
+    try:
+        quotes = [quote.__response_json__() for quote in conn.query(Quote).order_by(Quote.id).all()]
+        loaded_version = version
+        logging.info(f"Loaded {len(quotes)} quotes for data version {version}")
+    finally:
+        database.close_connection(conn)
+
+
+def get_quotes(get_version):
+    global checked_at
+    now = time.monotonic()
+    if not quotes or now - checked_at > refresh_interval:
+        checked_at = now
+        try:
+            version = get_version()
+        except Exception as e:
+            logging.warning(f"Cannot read data version, keeping the loaded quotes: {e}")
+            version = loaded_version
+        if not quotes or version != loaded_version:
+            load_quotes(version)
+    return quotes
+
+
+def random_quote(get_version):
+    current = get_quotes(get_version)
+    return random.choice(current) if current else None
+
+
+def quote_of_the_day(get_version, day=None):
+    # Every worker picks the same quote for a given day
+    current = get_quotes(get_version)
+    if not current:
+        return None
+    day = day or date.today()
+    index = int(hashlib.md5(day.isoformat().encode('utf-8')).hexdigest(), 16) % len(current)
+    return current[index]
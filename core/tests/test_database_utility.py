@@ -0,0 +1,77 @@
+import os
+import sys
+import unittest
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+core_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [core_folder, os.path.dirname(core_folder)]
+
+from config_manager import config_manager as appenv
+
+appenv.environ = appenv.environ or {}
+import database_utility
+from models import Base, Problem, ProblemType, Sheet, SheetSection, SheetSectionItem, SheetSectionItemResponse, \
+    Playlist, PlaylistSection, PlaylistItem
+
+
+class LoaderOptionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: self.statements.append(statement))
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def add_trees(self, prefix, trees, sections, items):
+        # Sheets and playlists of the given size, every sheet item matched with a problem
+        session = self.Session()
+        problem_type = ProblemType(uid=f'{prefix}type', name='Arrays')
+        session.add(problem_type)
+        for tree in [f'{prefix}{number}' for number in range(trees)]:
+            session.add(Sheet(uid=f's{tree}', name=f'Sheet {tree}'))
+            session.add(Playlist(uid=f'p{tree}', title=f'Playlist {tree}', description=''))
+            for section in range(sections):
+                section_uid = f'{tree}-{section}'
+                session.add(SheetSection(uid=f's{section_uid}', name='Section', sheet_uid=f's{tree}'))
+                session.add(PlaylistSection(uid=f'p{section_uid}', title='Section', playlist_uid=f'p{tree}'))
+                for item in range(items):
+                    item_uid = f'{section_uid}-{item}'
+                    session.add(SheetSectionItem(uid=f's{item_uid}', name='Item', sheet_section_uid=f's{section_uid}'))
+                    session.add(PlaylistItem(uid=f'p{item_uid}', title='Item', section_uid=f'p{section_uid}'))
+                    session.add(Problem(uid=f'problem{item_uid}', name='Item', url='', status='Done',
+                                        type=problem_type))
+                    session.add(SheetSectionItemResponse(uid=f'r{item_uid}', sheet_section_item_id=f's{item_uid}',
+                                                         problem_id=f'problem{item_uid}'))
+        session.commit()
+        session.close()
+
+    def count_queries(self, model, options):
+        # Statements run to load every tree and serialize it, lazy loads included
+        session = self.Session()
+        self.statements.clear()
+        trees = [tree.__response_json__() for tree in session.query(model).options(*options).all()]
+        session.close()
+        self.assertTrue(trees)
+        return len(self.statements)
+
+    def test_query_count_does_not_grow_with_the_trees(self):
+        self.add_trees('a', trees=1, sections=1, items=1)
+        small_sheets = self.count_queries(Sheet, database_utility.sheet_loader_options())
+        small_playlists = self.count_queries(Playlist, database_utility.playlist_loader_options())
+
+        self.add_trees('b', trees=3, sections=4, items=5)
+        self.assertEqual(self.count_queries(Sheet, database_utility.sheet_loader_options()), small_sheets)
+        self.assertEqual(self.count_queries(Playlist, database_utility.playlist_loader_options()), small_playlists)
+        self.assertLessEqual(small_sheets, 5)
+        self.assertLessEqual(small_playlists, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
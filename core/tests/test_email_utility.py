@@ -0,0 +1,124 @@
+import base64
+import os
+import smtplib
+import socketserver
+import sys
+import threading
+import unittest
+from unittest import mock
+
+core_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [core_folder, os.path.dirname(core_folder)]
+
+from config_manager import config_manager as appenv
+
+appenv.environ = appenv.environ or {}
+import email_utility
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    # Just enough of SMTP for smtplib: EHLO, AUTH PLAIN, MAIL, RCPT, DATA, NOOP and QUIT
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 localhost SMTP stand-in")
+        while True:
+            line = self.rfile.readline().decode().rstrip("\r\n")
+            if not line:
+                return
+            command = line.split(" ")[0].upper()
+            if command == "EHLO":
+                self.reply("250-localhost")
+                if server.starttls:
+                    self.reply("250-STARTTLS")
+                self.reply("250 AUTH PLAIN")
+            elif command == "AUTH":
+                server.logins.append(base64.b64decode(line.split(" ")[2]).split(b"\0")[1:])
+                self.reply("235 Authenticated")
+            elif command == "MAIL" or command == "RCPT" or command == "NOOP":
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                while (data := self.rfile.readline().decode()) != ".\r\n":
+                    body.append(data)
+                server.messages.append("".join(body))
+                self.reply("250 Queued")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Not implemented")
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, starttls=False):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.starttls = starttls
+        self.connections = 0
+        self.logins = []
+        self.messages = []
+
+
+class EmailUtilityTest(unittest.TestCase):
+
+    def setUp(self):
+        self.smtp = SMTPStandIn()
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+        self.saved_logs = []
+        patcher = mock.patch.object(email_utility, 'save_email_logs', self.saved_logs.extend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(email_utility.close_server)
+
+    def tearDown(self):
+        self.smtp.shutdown()
+        self.smtp.server_close()
+
+    def settings(self, allow_plaintext):
+        return {
+            'server': '127.0.0.1',
+            'port': self.smtp.server_address[1],
+            'username': 'bot@example.com',
+            'password': 'secret',
+            'recipient': 'me@example.com',
+            'allow_plaintext': allow_plaintext
+        }
+
+    def test_plaintext_login_is_refused_by_default(self):
+        with self.assertRaises(smtplib.SMTPNotSupportedError):
+            email_utility.connect(self.settings(allow_plaintext=False))
+        self.assertEqual(self.smtp.logins, [])
+
+    def test_mails_share_one_connection(self):
+        emails = [(f"Subject {index}", "text", "<p>html</p>") for index in range(3)]
+        with mock.patch.object(email_utility, 'get_smtp_settings', return_value=self.settings(True)):
+            sent = email_utility.send_emails(emails)
+
+        self.assertEqual(sent, 3)
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual(self.smtp.logins, [[b'bot@example.com', b'secret']])
+        self.assertEqual(len(self.smtp.messages), 3)
+        self.assertEqual([log[0] for log in self.saved_logs], ["Subject 0", "Subject 1", "Subject 2"])
+
+    def test_dead_connection_is_closed_and_replaced(self):
+        settings = self.settings(True)
+        with email_utility.server_lock:
+            dead = email_utility.get_server(settings)
+            email_utility.last_used = 0
+            with mock.patch.object(dead, 'noop', side_effect=smtplib.SMTPException("broken")):
+                connection = email_utility.get_server(settings)
+        self.assertIsNone(dead.sock)
+        self.assertIsNot(connection, dead)
+        self.assertEqual(self.smtp.connections, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
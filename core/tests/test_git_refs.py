@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+core_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [core_folder, os.path.dirname(core_folder)]
+
+import git_refs
+
+# Commits need an identity, whatever the git config of the machine running the tests
+git_identity = {
+    'GIT_AUTHOR_NAME': 'Test',
+    'GIT_AUTHOR_EMAIL': 'test@example.com',
+    'GIT_COMMITTER_NAME': 'Test',
+    'GIT_COMMITTER_EMAIL': 'test@example.com'
+}
+
+
+class GetBranchesTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, git_identity)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.repo = folder.name
+        self.git('init', '--initial-branch', 'main')
+        self.git('commit', '--allow-empty', '-m', 'First')
+
+    def git(self, *args):
+        subprocess.run(['git'] + list(args), cwd=self.repo, text=True, capture_output=True, check=True)
+
+    def test_nested_branch_is_listed(self):
+        self.git('branch', 'feature/x')
+        self.assertEqual(git_refs.get_branches(self.repo), ['main', 'x'])
+
+        # Only refs/heads/feature changes, refs/heads keeps its modification time
+        heads = os.path.join(self.repo, '.git', 'refs', 'heads')
+        modified = os.stat(heads).st_mtime_ns
+        self.git('branch', 'feature/y')
+        os.utime(heads, ns=(modified, modified))
+        self.assertEqual(git_refs.get_branches(self.repo), ['main', 'x', 'y'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+core_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [core_folder, os.path.dirname(core_folder)]
+
+from config_manager import config_manager as appenv
+
+appenv.environ = appenv.environ or {}
+import git_utility
+
+# Commits need an identity, whatever the git config of the machine running the tests
+git_identity = {
+    'GIT_AUTHOR_NAME': 'Test',
+    'GIT_AUTHOR_EMAIL': 'test@example.com',
+    'GIT_COMMITTER_NAME': 'Test',
+    'GIT_COMMITTER_EMAIL': 'test@example.com'
+}
+
+
+class SyncRepositoryTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, git_identity)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.remote = os.path.join(folder.name, 'remote.git')
+        self.clone = os.path.join(folder.name, 'clone')
+        self.other = os.path.join(folder.name, 'other')
+
+        self.git(folder.name, 'init', '--bare', '--initial-branch', 'main', self.remote)
+        self.git(folder.name, 'clone', self.remote, self.other)
+        self.write(self.other, 'notes.md', 'first\n')
+        self.commit(self.other, 'notes.md')
+        self.git(self.other, 'push', 'origin', 'HEAD:main')
+        self.git(folder.name, 'clone', '--branch', 'main', self.remote, self.clone)
+
+    def git(self, cwd, *args):
+        return subprocess.run(['git'] + list(args), cwd=cwd, text=True, capture_output=True, check=True).stdout
+
+    def write(self, repo_path, name, content):
+        with open(os.path.join(repo_path, name), 'w') as file:
+            file.write(content)
+
+    def read(self, repo_path, name):
+        with open(os.path.join(repo_path, name), 'r') as file:
+            return file.read()
+
+    def commit(self, repo_path, name):
+        self.git(repo_path, 'add', name)
+        self.git(repo_path, 'commit', '-m', f"Update {name}")
+
+    def test_reset_keeps_unpushed_commits(self):
+        # A debounced edit committed locally while another device pushed meanwhile
+        self.write(self.clone, 'edit.md', 'local edit\n')
+        self.commit(self.clone, 'edit.md')
+        self.write(self.other, 'remote.md', 'remote edit\n')
+        self.commit(self.other, 'remote.md')
+        self.git(self.other, 'push', 'origin', 'HEAD:main')
+
+        self.assertTrue(git_utility.sync_repository(self.clone, 'main', 'reset'))
+        self.assertEqual(self.read(self.clone, 'edit.md'), 'local edit\n')
+        self.assertEqual(self.read(self.clone, 'remote.md'), 'remote edit\n')
+        self.assertEqual(self.git(self.clone, 'rev-list', '--count', 'origin/main..HEAD').strip(), '1')
+
+    def test_reset_without_local_work_matches_the_remote(self):
+        self.write(self.other, 'notes.md', 'rewritten\n')
+        self.commit(self.other, 'notes.md')
+        self.git(self.other, 'push', 'origin', 'HEAD:main')
+
+        self.assertTrue(git_utility.sync_repository(self.clone, 'main', 'reset'))
+        self.assertEqual(self.git(self.clone, 'rev-parse', 'HEAD'), self.git(self.clone, 'rev-parse', 'origin/main'))
+        self.assertEqual(self.read(self.clone, 'notes.md'), 'rewritten\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import sys
+import unittest
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+core_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [core_folder, os.path.dirname(core_folder)]
+
+from config_manager import config_manager as appenv
+
+appenv.environ = appenv.environ or {}
+import search
+from models import Base, Note, NoteItem
+
+
+class RemoveNoteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def add_note(self, uid, title, content):
+        note = Note(uid=uid, title=title)
+        self.session.add(note)
+        self.session.flush()
+        self.session.add(NoteItem(uid=f'{uid}-item', filename=f'<repo_path>/notes/{title}/graphs.md',
+                                  extension='.md', note_id=note.id))
+        self.session.commit()
+        search.index_rows(self.session, 'note', [{
+            'kind': 'note',
+            'ref': f'{uid}-item',
+            'parent': uid,
+            'title': f'{title} graphs.md',
+            'body': content
+        }], uid)
+        return note
+
+    def test_deleted_note_is_not_found(self):
+        if not search.create_search_index(self.session):
+            self.skipTest("SQLite is built without FTS5")
+        deleted = self.add_note('n1', 'Graphs', 'dijkstra shortest path')
+        self.add_note('n2', 'Trees', 'dijkstra on a tree')
+
+        # Same steps as the delete of operation_on_note
+        self.session.delete(deleted)
+        search.remove_note(self.session, deleted.uid)
+        self.session.commit()
+
+        self.assertEqual([result['parent'] for result in search.search(self.session, 'dijkstra', 'note')], ['n2'])
+
+    def test_missing_index_keeps_the_delete(self):
+        note = self.add_note('n1', 'Graphs', 'dijkstra')
+        self.session.execute(text("DROP TABLE IF EXISTS search_index"))
+        self.session.commit()
+
+        self.session.delete(note)
+        search.remove_note(self.session, note.uid)
+        self.session.commit()
+
+        self.assertEqual(self.session.query(Note).count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
+import base64
 import json
 import logging
 import os
@@ -242,3 +243,29 @@ def parse_time(time_str):
     if time_str and len(str(time_str).strip()) > 0:
         return datetime.strptime(time_str, "%H:%M").time()
     return None
+
+
+def encode_cursor(values):
+    # Encodes the sort key of the last row into an opaque url-safe token
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode('utf-8')).decode('utf-8')
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')).decode('utf-8'))
+    except Exception:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    if not isinstance(values, list):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return values
+
+
+def parse_fields(fields, allowed_fields):
+    # Parses the comma separated fields= parameter, None means every field
+    if fields is None or len(fields.strip()) == 0:
+        return None
+    fields = [field.strip() for field in fields.split(",") if len(field.strip()) > 0]
+    invalid_fields = [field for field in fields if field not in allowed_fields]
+    if len(invalid_fields) > 0:
+        raise ValueError(f"Invalid fields: {', '.join(invalid_fields)}")
+    return fields
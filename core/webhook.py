@@ -3,7 +3,7 @@ import logging
 from pydantic import BaseModel
 
 import database_utility as database
-from core import intellisense
+from core import intellisense, search
 from core.models import Sheet, SheetSection, SheetSectionItem, Playlist, PlaylistSection, PlaylistItem
 
 # Configure the logging settings
@@ -67,6 +67,7 @@ def performAction(data):
                     conn.add(item)
             conn.commit()
             intellisense.run_intellisense(conn)
+            search.index_sheet_items(conn, sheet.uid)
             conn.close()
 
     except Exception as e:
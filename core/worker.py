@@ -0,0 +1,174 @@
+import contextlib
+import logging
+import threading
+import time
+from datetime import datetime
+
+import application_updator as updator
+import importer
+import job_queue
+from codebase import cache, webhook_tags
+from config_manager import config_manager as appenv
+
+# Configure the logging settings
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+)
+
+# Seconds a worker thread waits when the queue is empty
+poll_interval = 1
+
+# Longest wait between two reminder runs, reminders added or edited meanwhile are picked up by the next one
+reminder_interval = 3600
+
+
+def reindex(payload):
+    updator.init_system(payload.get('manual', False))
+
+
+def send_mail(payload):
+    updator.send_mail()
+
+
+def git_push(payload):
+    updator.commit_and_push_files(payload['files'])
+
+
+def build_branch(payload):
+    previous = updator.get_active_branch()
+    updator.build_branch(payload['branch'])
+    updator.activate_branch(payload['branch'])
+    cache.switch_data_version(previous, payload['branch'], rebuilt=True)
+
+
+def advance_reminders(payload):
+    fired, next_due = updator.advance_reminders()
+    if fired:
+        cache.invalidate('reminders')
+    schedule_reminders(next_due)
+
+
+def schedule_reminders(next_due=None):
+    # One queued run at a time, due when the next reminder fires
+    if job_queue.get_latest('advance-reminders', ['QUEUED']) is not None:
+        return
+    delay = reminder_interval
+    if next_due is not None:
+        delay = min(delay, max((next_due - datetime.now()).total_seconds(), 0))
+    job_queue.enqueue('advance-reminders', delay=delay)
+
+
+def activate_branch(payload):
+    previous = updator.get_active_branch()
+    updator.activate_branch(payload['branch'])
+    # The user tables of the branch were just replaced, what was cached for it before is stale
+    cache.switch_data_version(previous, payload['branch'], rebuilt=True)
+
+
+def import_tree(payload):
+    counts = importer.import_tree(payload)
+    # Only the imported sheet or playlist is dropped from the caches
+    tags = webhook_tags[f"import-{payload['kind']}"]
+    cache.invalidate(*[tag.format(uid=payload['uid']) for tag in tags])
+    return counts
+
+
+handlers = {
+    'reindex': reindex,
+    'send-mail': send_mail,
+    'git-push': git_push,
+    'build-branch': build_branch,
+    'activate-branch': activate_branch,
+    'advance-reminders': advance_reminders,
+    'import': import_tree
+}
+
+# Jobs that point the process at another branch, or replace the data of the served one, run alone
+exclusive_kinds = ('reindex', 'build-branch', 'activate-branch')
+
+
+class BranchLock:
+    # Shared by the jobs working on the served branch, held alone by the exclusive kinds
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.shared = 0
+        self.exclusive = False
+        self.exclusive_waiting = 0
+
+    @contextlib.contextmanager
+    def hold(self, exclusive):
+        with self.condition:
+            if exclusive:
+                self.exclusive_waiting += 1
+                self.condition.wait_for(lambda: not self.exclusive and self.shared == 0)
+                self.exclusive_waiting -= 1
+                self.exclusive = True
+            else:
+                # A waiting exclusive job goes first, so a stream of short jobs cannot hold off a branch switch
+                self.condition.wait_for(lambda: not self.exclusive and self.exclusive_waiting == 0)
+                self.shared += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                if exclusive:
+                    self.exclusive = False
+                else:
+                    self.shared -= 1
+                self.condition.notify_all()
+
+
+branch_lock = BranchLock()
+
+# Jobs that change the served data, the response caches are invalidated once they succeed
+data_changing_kinds = ('reindex',)
+
+
+def run_job(job):
+    handler = handlers.get(job.kind)
+    if handler is None:
+        job_queue.fail(job.id, f"Unknown job kind: {job.kind}")
+        return
+
+    logging.info(f"Job {job.id} ({job.kind}) started, attempt {job.attempts}")
+    try:
+        with branch_lock.hold(job.kind in exclusive_kinds):
+            # Follow a branch switched by the web server
+            updator.use_active_branch()
+            result = handler(job.get_payload())
+    except Exception as e:
+        logging.exception(f"Job {job.id} ({job.kind}) raised")
+        job_queue.fail(job.id, e)
+        return
+
+    job_queue.complete(job.id, result)
+    if job.kind in data_changing_kinds:
+        cache.invalidate_all()
+    logging.info(f"Job {job.id} ({job.kind}) done")
+
+
+def work():
+    while True:
+        try:
+            job = job_queue.claim()
+        except Exception as e:
+            logging.warning(f"Cannot claim a job: {e}")
+            job = None
+
+        if job is None:
+            time.sleep(poll_interval)
+        else:
+            run_job(job)
+
+
+def run_worker():
+    # Runs until the process stops, started once next to the web server
+    job_queue.recover()
+    schedule_reminders(datetime.now())
+    threads = int((appenv.environ or {}).get('JOB_WORKER_THREADS') or 2)
+    logging.info(f"Job worker started with {threads} threads")
+    for _ in range(threads - 1):
+        threading.Thread(target=work, daemon=True).start()
+    work()
@@ -4,8 +4,10 @@
 echo "vm.overcommit_memory = 1" > /etc/sysctl.d/99-custom.conf
 sysctl -p
 
-# Start Redis server in the background
-redis-server --daemonize yes
+# Start Redis server in the background, bounding the memory used by the shared response cache
+redis-server --daemonize yes \
+  --maxmemory "${CACHE_MAX_MEMORY:-256mb}" \
+  --maxmemory-policy "${CACHE_EVICTION_POLICY:-volatile-lru}"
 
 # Run the configuration script
 python /app/generate_config.py
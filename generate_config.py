@@ -60,7 +60,9 @@ def generate_config_yaml():
         'SMTP_PORT': os.getenv('SMTP_PORT', '587'),
         'SMTP_USERNAME': os.getenv('SMTP_USERNAME', ''),
         'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY', ''),
-        'YOUTUBE_API_KEY': os.getenv('YOUTUBE_API_KEY', '')
+        'YOUTUBE_API_KEY': os.getenv('YOUTUBE_API_KEY', ''),
+        'CACHE_REDIS_URL': os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/1'),
+        'CACHE_DEFAULT_TIMEOUT': os.getenv('CACHE_DEFAULT_TIMEOUT', '120')
     }
 
     with open('config.yaml', 'w') as yaml_file:
@@ -4,7 +4,6 @@ import os
 import redis
 import shortuuid
 from flask import Flask, jsonify, send_from_directory, request
-from flask_caching import Cache
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -12,7 +11,9 @@ from flask_limiter.util import get_remote_address
 from models import VideoSolutions
 from services import youtube_service, chatgpt_service, coderunner_service
 import database_utility as database
+from cache_manager import CacheManager
 from config_manager import config_manager as appenv
+from json_provider import init_json_provider
 
 # Configure the logging settings
 logging.basicConfig(
@@ -21,7 +22,8 @@ logging.basicConfig(
 )
 
 app = Flask(__name__)
-cache = Cache(app, config={'CACHE_TYPE': 'simple'})
+cache = CacheManager('integration', app)
+init_json_provider(app)
 CORS(app)  # Enable CORS for all routes
 
 # Set up Redis
@@ -0,0 +1,83 @@
+import logging
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Configure the logging settings
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+)
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider backed by orjson, used for the responses built with jsonify.
+
+    The keys are sorted like the default provider, and dates are still handed to the default provider so they keep
+    their HTTP date format. Loading is left to the default provider.
+    """
+
+    options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        # Callers asking for specific encoder arguments get the stdlib encoder
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.options).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        # Same trailing newline as the default provider
+        return self._app.response_class(orjson.dumps(obj, default=self.default, option=self.options) + b"\n",
+                                        mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    if orjson is None:
+        logging.warning("orjson is not installed, using the default JSON provider")
+        return
+    app.json = ORJSONProvider(app)
+
+
+if __name__ == "__main__":
+    import json
+    import random
+    import timeit
+    from datetime import datetime
+
+    from flask import Flask
+
+    # Payload shaped like /api/problems?res=detail
+    problems = [{
+        'id': f'problem-{index}',
+        'title': f'Problem {index}',
+        'level': random.choice(['Easy', 'Medium', 'Hard']),
+        'type': 'Arrays',
+        'status': 'COMPLETED',
+        'companies': ['Google', 'Amazon', 'Microsoft'],
+        'remarks': 'Sliding window over the prefix sums',
+        'date_added': datetime.now(),
+        'include_count': True,
+        'url': f'https://example.com/problems/{index}'
+    } for index in range(5000)]
+    payload = {'problems': problems, 'next_cursor': None}
+
+    default_app = Flask('default')
+    orjson_app = Flask('orjson')
+    init_json_provider(orjson_app)
+
+    for name, app in (('json', default_app), ('orjson', orjson_app)):
+        with app.app_context():
+            seconds = timeit.timeit(lambda: app.json.response(payload).get_data(), number=20) / 20
+            print(f"{name:>8}: {seconds * 1000:.2f} ms per response")
+
+        with app.app_context():
+            body = app.json.response(payload).get_data()
+        assert json.loads(body) == json.loads(default_app.json.dumps(payload)), "responses differ"
@@ -1,8 +1,8 @@
 import logging
 import re
 
-from sqlalchemy import create_engine, text, event, inspect
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, text, event, tuple_
+from sqlalchemy.orm import sessionmaker, selectinload, scoped_session
 
 import os
 
@@ -22,6 +22,12 @@ engine = create_engine(f'sqlite:///{database}')
 Session = sessionmaker(bind=engine)
 metadata = Base.metadata
 
+# One session per request (thread), its connection goes back to the engine pool when the request ends
+request_session = scoped_session(Session)
+
+default_page_size = 100
+max_page_size = 500
+
 table_objects = {
     "playlist": Playlist,
     "playlist_section": PlaylistSection,
@@ -32,29 +38,108 @@ table_objects = {
 }
 
 
-# Function to initialize the database and tables
+# Loader options that fetch a whole sheet tree (sections and items) in a fixed number of queries
+def sheet_loader_options():
+    return [
+        selectinload(Sheet.sections).selectinload(SheetSection.items)
+    ]
+
+
+# Loader options that fetch a whole playlist tree (sections and items) in a fixed number of queries
+def playlist_loader_options():
+    return [
+        selectinload(Playlist.sections).selectinload(PlaylistSection.items)
+    ]
+
+
+# Format of the import payloads, read by the importer of the core service
+export_format = 'columnar-v1'
+
+
+def export_table(query, columns):
+    # Columnar block: the column names once, then one list of values per row
+    return {
+        'columns': [column.key for column in columns],
+        'rows': [list(row) for row in query]
+    }
+
+
+def export_sheet(session, uid):
+    """
+    Build the import payload of a sheet straight from its columns, None when the sheet does not exist.
+
+    Values are sent as stored (companies and concepts stay ':' joined) and the status columns are left out, the
+    progress of a sheet belongs to the core database.
+
+    :param session: Database session
+    :param uid: Uid of the sheet
+    """
+    record_columns = [Sheet.uid, Sheet.name, Sheet.description, Sheet.url, Sheet.image, Sheet.total_items_count]
+    record = session.query(*record_columns).filter(Sheet.uid == uid).first()
+    if record is None:
+        return None
+
+    section_columns = [SheetSection.uid, SheetSection.name, SheetSection.description]
+    item_columns = [SheetSectionItem.uid, SheetSectionItem.sheet_section_uid, SheetSectionItem.name,
+                    SheetSectionItem.url, SheetSectionItem.description, SheetSectionItem.level,
+                    SheetSectionItem.companies, SheetSectionItem.concepts, SheetSectionItem.frequency]
+    sections = session.query(*section_columns).filter(SheetSection.sheet_uid == uid).order_by(SheetSection.id)
+    items = session.query(*item_columns).join(SheetSection, SheetSectionItem.sheet_section_uid == SheetSection.uid) \
+        .filter(SheetSection.sheet_uid == uid).order_by(SheetSectionItem.id)
+    return {
+        'format': export_format,
+        'kind': 'sheet',
+        'uid': uid,
+        'record': record._asdict(),
+        'sections': export_table(sections, section_columns),
+        'items': export_table(items, item_columns)
+    }
+
+
+def export_playlist(session, uid):
+    """
+    Build the import payload of a playlist straight from its columns, None when the playlist does not exist.
+
+    :param session: Database session
+    :param uid: Uid of the playlist
+    """
+    record_columns = [Playlist.uid, Playlist.title, Playlist.description, Playlist.total_items_count]
+    record = session.query(*record_columns).filter(Playlist.uid == uid).first()
+    if record is None:
+        return None
+
+    section_columns = [PlaylistSection.uid, PlaylistSection.title, PlaylistSection.description]
+    item_columns = [PlaylistItem.uid, PlaylistItem.section_uid, PlaylistItem.title, PlaylistItem.description,
+                    PlaylistItem.image, PlaylistItem.url, PlaylistItem.content, PlaylistItem.content_type]
+    sections = session.query(*section_columns).filter(PlaylistSection.playlist_uid == uid) \
+        .order_by(PlaylistSection.id)
+    items = session.query(*item_columns).join(PlaylistSection, PlaylistItem.section_uid == PlaylistSection.uid) \
+        .filter(PlaylistSection.playlist_uid == uid).order_by(PlaylistItem.id)
+    return {
+        'format': export_format,
+        'kind': 'playlist',
+        'uid': uid,
+        'record': record._asdict(),
+        'sections': export_table(sections, section_columns),
+        'items': export_table(items, item_columns)
+    }
+
+
+# Function to initialize the database and tables, run once when the application starts
 def init_database():
-    global Session, engine, metadata
-    if os.path.exists("marketplace.lock"):
-        # Create the SQLAlchemy engine again
-        engine = create_engine(f'sqlite:///{database}')
-        Session = sessionmaker(bind=engine)
-        metadata = Base.metadata
+    # Only the missing tables are created
+    metadata.create_all(engine)
+
+    # No connection is kept open, gunicorn forks its workers after this and SQLite connections must not cross processes
+    engine.dispose()
 
-    # Create a session
-    session = Session()
 
-    # Check if tables exist
-    inspector = inspect(engine)
-    existing_tables = inspector.get_table_names()
+def get_session():
+    return request_session()
 
-    # Check if tables exist in metadata
-    if not set(Base.metadata.tables.keys()).issubset(existing_tables):
-        # Create tables
-        Base.metadata.create_all(engine)
 
-    # Return the session
-    return session
+def remove_session(exception=None):
+    request_session.remove()
 
 
 # Function to remove the main database
@@ -103,6 +188,35 @@ def insert_data(session, table_name, data, include_primary=False):
     return model_instance.id
 
 
+def paginate(query, order_columns, key, cursor=None, limit=None):
+    """
+    Apply keyset pagination to the query.
+
+    :param query: Query to paginate
+    :param order_columns: Columns giving a stable, unique ordering of the rows
+    :param key: Function returning the values of the order columns for a row
+    :param cursor: Token returned as next_cursor by the previous page
+    :param limit: Maximum number of rows in the page
+    :return: Tuple of the rows and the cursor of the next page (None when there are no more rows)
+    """
+    query = query.order_by(*order_columns)
+    if cursor is None and limit is None:
+        return query.all(), None
+
+    if cursor is not None:
+        values = utility.decode_cursor(cursor)
+        if len(values) != len(order_columns):
+            raise ValueError(f"Invalid cursor '{cursor}'")
+        query = query.filter(tuple_(*order_columns) > tuple_(*values))
+
+    limit = min(max(int(limit or default_page_size), 1), max_page_size)
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, utility.encode_cursor(key(rows[-1]))
+    return rows, None
+
+
 # Function to execute a custom SQL query
 def execute_query(connection, query):
     connection.execute(text(query))
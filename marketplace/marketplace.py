@@ -5,14 +5,15 @@ from io import BytesIO
 
 import redis
 import requests
-from flask import Flask, jsonify, abort, send_from_directory, send_file
-from flask_caching import Cache
+from flask import Flask, jsonify, abort, send_from_directory, send_file, request
 from flask_cors import CORS
 import pandas as pd
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
+from cache_manager import CacheManager
 from config_manager import config_manager as appenv
+from json_provider import init_json_provider
 import database_utility
 from models import Sheet, Playlist
 
@@ -23,7 +24,10 @@ logging.basicConfig(
 )
 
 app = Flask(__name__)
-cache = Cache(app, config={'CACHE_TYPE': 'simple'})
+cache = CacheManager('marketplace', app)
+database_utility.init_database()
+app.teardown_appcontext(database_utility.remove_session)
+init_json_provider(app)
 CORS(app)  # Enable CORS for all routes
 
 # Set up Redis
@@ -64,22 +68,39 @@ def home(path):
 
 @app.route('/status')
 def status():
-    return jsonify({
+    return cache.conditional(jsonify({
         'status': 'active'
+    }))
+
+
+@app.route('/metrics/cache', methods=['GET'])
+@limiter.limit(rate_limit_rule)
+def get_cache_metrics():
+    return jsonify({
+        'status': 'success',
+        'metrics': cache.get_metrics()
     })
 
 
-@cache.cached(timeout=120)
 @app.route('/sheets', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('sheets', timeout=600)
 def get_sheets():
     # Query all sheets
     logging.info("get_sheets(): begin..")
-    conn = database_utility.init_database()
-    sheets = conn.query(Sheet.uid, Sheet.name, Sheet.image, Sheet.total_items_count).all()
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', type=int)
+    conn = database_utility.get_session()
+    try:
+        sheets, next_cursor = database_utility.paginate(
+            conn.query(Sheet.uid, Sheet.name, Sheet.image, Sheet.total_items_count, Sheet.id), [Sheet.id],
+            lambda row: [row[4]], cursor, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     sheets_data = [{'uid': sheet[0], 'name': sheet[1], 'image': sheet[2], 'total_count': sheet[3]} for sheet in sheets]
     return jsonify({
-        'sheets': sheets_data
+        'sheets': sheets_data,
+        'next_cursor': next_cursor
     })
 
 
@@ -87,32 +108,10 @@ def get_sheets():
 @limiter.limit(rate_limit_rule)
 def import_sheet(uid):
     logging.info("import_sheet(" + uid + "): begin..")
-    conn = database_utility.init_database()
-    sheet = conn.query(Sheet).filter_by(uid=uid).first()
-    if sheet is None:
+    payload = database_utility.export_sheet(database_utility.get_session(), uid)
+    if payload is None:
         abort(404, description="Sheet not found")
-
-    sheet_data = sheet.__response_json__()
-
-    # Define the webhook endpoint URL
-    webhook_url = f'http://localhost:{baseport}/cb/api/webhook'
-
-    # Define the JSON payload to send
-    payload = {
-        "event": "import-sheet",
-        "payload": sheet_data
-    }
-
-    # Send a POST request to the webhook endpoint with the JSON payload
-    response = requests.post(webhook_url, json=payload)
-
-    # Check the response status code and content
-    if response.status_code == 200:
-        logging.info(f"Webhook call successful for sheet {uid}")
-    else:
-        logging.info(f'Error while calling webhook for sheet {uid} \n {response.text}')
-
-    return response.json(), response.status_code
+    return send_import(payload)
 
 
 @app.route('/sheet/download/<string:uid>', methods=['GET'])
@@ -121,8 +120,8 @@ def download_sheet(uid):
     sheet_csv = ['Name', 'URL', 'Description', 'Level', 'Category', 'Companies', 'Concepts', 'Frequency']
     # Query the sheet by uid
     logging.info("download_sheet_csv(" + uid + "): begin..")
-    conn = database_utility.init_database()
-    sheet = conn.query(Sheet).filter_by(uid=uid).first()
+    conn = database_utility.get_session()
+    sheet = conn.query(Sheet).options(*database_utility.sheet_loader_options()).filter_by(uid=uid).first()
     if sheet is None:
         abort(404, description="Sheet not found")
 
@@ -155,14 +154,14 @@ def generate_excel(headers, data):
     return output
 
 
-@cache.cached(timeout=120)
 @app.route('/sheet/<string:uid>', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('sheet', timeout=600)
 def get_sheet_by_uid(uid):
     # Query the sheet by uid
     logging.info("get_sheet(" + uid + "): begin..")
-    conn = database_utility.init_database()
-    sheet = conn.query(Sheet).filter_by(uid=uid).first()
+    conn = database_utility.get_session()
+    sheet = conn.query(Sheet).options(*database_utility.sheet_loader_options()).filter_by(uid=uid).first()
     if sheet is None:
         abort(404, description="Sheet not found")
     sheet_data = sheet.__response_json__()
@@ -171,29 +170,38 @@ def get_sheet_by_uid(uid):
     })
 
 
-@cache.cached(timeout=120)
 @app.route('/playlists', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('playlists', timeout=600)
 def get_playlists():
     # Query all playlists
     logging.info("get_playlists(): begin..")
-    conn = database_utility.init_database()
-    playlists = conn.query(Playlist.uid, Playlist.title, Playlist.description, Playlist.total_items_count).all()
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', type=int)
+    conn = database_utility.get_session()
+    try:
+        playlists, next_cursor = database_utility.paginate(
+            conn.query(Playlist.uid, Playlist.title, Playlist.description, Playlist.total_items_count, Playlist.id),
+            [Playlist.id], lambda row: [row[4]], cursor, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     playlists_data = [{'uid': playlist[0], 'name': playlist[1], 'desc': playlist[2], 'total_count': playlist[3]} for
                       playlist in playlists]
     return jsonify({
-        'playlists': playlists_data
+        'playlists': playlists_data,
+        'next_cursor': next_cursor
     })
 
 
-@cache.cached(timeout=120)
 @app.route('/playlist/<string:uid>', methods=['GET'])
 @limiter.limit(rate_limit_rule)
+@cache.cached_endpoint('playlist', timeout=600)
 def get_playlist_by_uid(uid):
     # Query the playlist by uid
     logging.info("get_playlist(" + uid + "): begin..")
-    conn = database_utility.init_database()
-    playlist = conn.query(Playlist).filter_by(uid=uid).first()
+    conn = database_utility.get_session()
+    playlist = conn.query(Playlist).options(*database_utility.playlist_loader_options()).filter_by(
+        uid=uid).first()
     if playlist is None:
         abort(404, description="Playlist not found")
     playlist_data = playlist.__response_json__()
@@ -206,30 +214,22 @@ def get_playlist_by_uid(uid):
 @limiter.limit(rate_limit_rule)
 def import_playlist(uid):
     logging.info("import_playlist(" + uid + "): begin..")
-    conn = database_utility.init_database()
-    playlist = conn.query(Playlist).filter_by(uid=uid).first()
-    if playlist is None:
-        abort(404, description="Sheet not found")
-
-    playlist_data = playlist.__response_json__()
-
-    # Define the webhook endpoint URL
-    webhook_url = f'http://localhost:{baseport}/cb/api/webhook'
+    payload = database_utility.export_playlist(database_utility.get_session(), uid)
+    if payload is None:
+        abort(404, description="Playlist not found")
+    return send_import(payload)
 
-    # Define the JSON payload to send
-    payload = {
-        "event": "import-playlist",
-        "payload": playlist_data
-    }
 
-    # Send a POST request to the webhook endpoint with the JSON payload
-    response = requests.post(webhook_url, json=payload)
+def send_import(payload):
+    # Core queues the import and answers at once with the id of the job, its status is served at /cb/api/job/<id>
+    import_url = f'http://localhost:{baseport}/cb/api/import'
+    response = requests.post(import_url, json=payload)
 
-    # Check the response status code and content
-    if response.status_code == 200:
-        logging.info(f"Webhook call successful for playlist {uid}")
+    kind, uid = payload['kind'], payload['uid']
+    if response.status_code == 202:
+        logging.info(f"Import of {kind} {uid} queued as job {response.json().get('job')}")
     else:
-        logging.info(f'Error while calling webhook for playlist {uid} \n {response.text}')
+        logging.info(f'Error while queuing the import of {kind} {uid} \n {response.text}')
 
     return response.json(), response.status_code
 
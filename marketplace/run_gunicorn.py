@@ -4,7 +4,7 @@ import sys
 
 from gunicorn.app.base import BaseApplication
 
-from marketplace import app, port
+from marketplace import app, cache, port
 
 logging.basicConfig(
     level=logging.INFO,
@@ -21,6 +21,8 @@ class FlaskApplication(BaseApplication):
     def __init__(self, app, options=None):
         self.options = options or {}
         self.application = app
+        # The bundled database may have changed since the last deployment
+        cache.invalidate_all()
         super().__init__()
 
     def load_config(self):
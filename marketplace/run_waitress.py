@@ -1,7 +1,7 @@
 import logging
 import sys
 from waitress import serve
-from marketplace import app, port
+from marketplace import app, cache, port
 
 # Configure the logging settings
 logging.basicConfig(
@@ -16,6 +16,8 @@ app.logger.addHandler(flask_log_handler)
 
 
 def run_server():
+    # The bundled database may have changed since the last deployment
+    cache.invalidate_all()
     serve(app, host='0.0.0.0', port=port, threads=10)
 
 
@@ -1,3 +1,4 @@
+import base64
 import json
 import logging
 import os
@@ -24,3 +25,18 @@ def create_slug(input_string):
     # Remove leading and trailing hyphens
     slug = slug.strip('-')
     return slug
+
+
+def encode_cursor(values):
+    # Encodes the sort key of the last row into an opaque url-safe token
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode('utf-8')).decode('utf-8')
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')).decode('utf-8'))
+    except Exception:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    if not isinstance(values, list):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return values